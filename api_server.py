@@ -0,0 +1,262 @@
+# Lightweight asyncio JSON service exposing the insights without Streamlit
+#
+#   python api_server.py --port 8080
+#   GET  /insights?birthdate=1990-05-17[&currency=USD]
+#   POST /insights/batch   {"birthdates": ["1990-05-17", ...], "currency": "USD"}
+#   GET  /health
+#   GET  /metrics          Prometheus text format (with AGE_INSIGHTS_METRICS=1, see metrics.py)
+#
+# The datasets are compiled once and stay in memory; connections are kept alive, the number of
+# requests handled at once is bounded and single-birthdate responses are cached.
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import math
+import urllib.parse
+
+import numpy as np
+
+import insights
+import metrics
+import refresher
+import registry
+from inflation import DEFAULT_CURRENCY
+
+FIRST_BIRTHDATE = datetime.date(1900, 1, 1)
+# largest number of birthdates accepted by one batch request
+MAX_BATCH_SIZE = 100000
+# largest request body accepted (bytes)
+MAX_BODY_SIZE = 4 * 1024 * 1024
+# seconds an idle keep-alive connection stays open
+KEEP_ALIVE_TIMEOUT = 15
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+########################################
+# Datasets kept resident in memory (shared with anything else in the process through the registry)
+_registry = None
+
+
+# Define a function to get the year table, rebuilt when the year rolls over or a CSV in Data/ changes
+def get_table(today):
+    global _registry
+    datasets = registry.current(today.year)
+    if datasets is not _registry:
+        _registry = datasets
+        _single_response.cache_clear()
+    return datasets.year_table
+
+
+# Define a function to turn a NumPy value into something JSON can encode (NaN becomes null)
+def _plain(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+# Define a function to split a column-oriented result into one JSON object per birthdate
+def _rows(result):
+    columns = {key: values.tolist() for key, values in result.items()}
+    return [{key: _plain(values[i]) for key, values in columns.items()} for i in range(len(result['birthdate']))]
+
+
+# Define a function to parse and validate one birthdate
+def _parse_birthdate(text, today):
+    try:
+        birthdate = datetime.date.fromisoformat(str(text))
+    except ValueError:
+        raise HTTPError(400, f"invalid birthdate {text!r}, expected YYYY-MM-DD")
+    if not FIRST_BIRTHDATE <= birthdate <= today:
+        raise HTTPError(400, f"birthdate {text} must be between {FIRST_BIRTHDATE} and {today}")
+    return birthdate
+
+
+def _check_currency(currency, table):
+    if not isinstance(currency, str):
+        raise HTTPError(400, f"'currency' must be a string, expected one of {table.inflation.currencies}")
+    if currency not in table.inflation.codes:
+        raise HTTPError(400, f"unknown currency {currency!r}, expected one of {table.inflation.currencies}")
+
+
+# repeat keys (the same birthdate on the same day) are answered from this cache
+@functools.lru_cache(maxsize=65536)
+def _single_response(birthdate, currency, today):
+    result = insights.compute_insights([birthdate], today, get_table(today), currency)
+    return json.dumps(_rows(result)[0]).encode()
+
+
+########################################
+# Endpoints
+def handle_single(query):
+    today = datetime.date.today()
+    table = get_table(today)
+    params = urllib.parse.parse_qs(query)
+    if 'birthdate' not in params:
+        raise HTTPError(400, "missing 'birthdate' query parameter")
+    birthdate = _parse_birthdate(params['birthdate'][0], today)
+    currency = params.get('currency', [DEFAULT_CURRENCY])[0]
+    _check_currency(currency, table)
+    return _single_response(birthdate, currency, today)
+
+
+def handle_batch(body):
+    today = datetime.date.today()
+    table = get_table(today)
+    try:
+        request = json.loads(body or b'{}')
+        birthdates = request['birthdates']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPError(400, "expected a JSON object with a 'birthdates' list")
+    if not isinstance(birthdates, list):
+        raise HTTPError(400, "'birthdates' must be a list")
+    if len(birthdates) > MAX_BATCH_SIZE:
+        raise HTTPError(413, f"at most {MAX_BATCH_SIZE} birthdates per batch")
+    currency = request.get('currency', DEFAULT_CURRENCY)
+    _check_currency(currency, table)
+    birthdates = [_parse_birthdate(birthdate, today) for birthdate in birthdates]
+    result = insights.compute_insights(birthdates, today, table, currency)
+    return json.dumps({'results': _rows(result)}).encode()
+
+
+def handle_metrics():
+    if not metrics.DEFAULT.enabled:
+        raise HTTPError(404, "metrics are off, set AGE_INSIGHTS_METRICS=1")
+    return metrics.exposition().encode()
+
+
+def handle_health():
+    info = _single_response.cache_info()
+    return json.dumps({'status': 'ok', 'cache': {'hits': info.hits, 'misses': info.misses,
+                                                 'size': info.currsize, 'maxsize': info.maxsize}}).encode()
+
+
+########################################
+# HTTP/1.1 over asyncio streams
+class InsightsServer:
+    def __init__(self, max_concurrency=64):
+        # bounds the number of requests computed at the same time across all connections
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def dispatch(self, method, path, query, body):
+        if path == '/insights':
+            if method != 'GET':
+                raise HTTPError(405, "use GET")
+            with metrics.span('api:insights'):
+                return handle_single(query)
+        if path == '/insights/batch':
+            if method != 'POST':
+                raise HTTPError(405, "use POST")
+            # large batches are vectorized but still take a while; keep the event loop free
+            with metrics.span('api:batch'):
+                return await asyncio.get_running_loop().run_in_executor(None, handle_batch, body)
+        if path == '/health':
+            return handle_health()
+        if path == '/metrics':
+            return handle_metrics()
+        raise HTTPError(404, f"no endpoint {path}")
+
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b''
+        path, _, query = target.partition('?')
+        # HTTP/1.1 keeps the connection open unless asked not to; HTTP/1.0 only when asked to
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, path, query, body, keep_alive
+
+    @staticmethod
+    def write_response(writer, status, body, keep_alive, content_type='application/json'):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except asyncio.IncompleteReadError:
+                    break
+                except HTTPError as error:
+                    self.write_response(writer, error.status, json.dumps({'error': error.message}).encode(), False)
+                    break
+                if request is None:
+                    break
+                method, path, query, body, keep_alive = request
+                async with self.semaphore:
+                    try:
+                        status, payload = 200, await self.dispatch(method, path, query, body)
+                    except HTTPError as error:
+                        status, payload = error.status, json.dumps({'error': error.message}).encode()
+                    except Exception as error:
+                        status, payload = 500, json.dumps({'error': str(error)}).encode()
+                content_type = 'text/plain; version=0.0.4' if path == '/metrics' and status == 200 else 'application/json'
+                self.write_response(writer, status, payload, keep_alive, content_type)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        # load the datasets before accepting the first request
+        get_table(datetime.date.today())
+        metrics.register('response_cache', lambda: _single_response.cache_info()._asdict())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving insights on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JSON API for the age insights')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-concurrency', type=int, default=64,
+                        help='number of requests handled at the same time')
+    args = parser.parse_args()
+    # background refresh of Data/ from the upstream sources, when enabled (see refresher.py)
+    refresher.start()
+    asyncio.run(InsightsServer(args.max_concurrency).serve(args.host, args.port))
@@ -0,0 +1,119 @@
+# Headless runs of main.py through Streamlit's testing harness, shared by the benchmark and load tools
+import collections
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, 'main.py')
+# `streamlit run` puts the script's folder on sys.path and the app reads Data/ relative to it
+sys.path.insert(0, REPO_DIR)
+os.chdir(REPO_DIR)
+
+from streamlit import config  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage  # noqa: E402
+from streamlit.runtime.scriptrunner import RerunData, ScriptRunnerEvent  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.testing.element_tree import parse_tree_from_messages  # noqa: E402
+from streamlit.testing.local_script_runner import LocalScriptRunner  # noqa: E402
+
+_session = None
+# compiled script shared by every runner, like the server shares it between sessions
+# (compiling the same script in several threads at once trips a CPython 3.11 AST bug)
+_script_cache = ScriptCache()
+
+# events that end a script run
+STOP_EVENTS = (ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS, ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR,
+               ScriptRunnerEvent.SCRIPT_STOPPED_FOR_RERUN)
+
+# the start of the age breakdown (Fact1), the first fact on the result page
+FIRST_FACT_PREFIX = 'You are **'
+
+# seconds until the script finished, seconds until the first fact was sent, and the forward messages
+Render = collections.namedtuple('Render', ['seconds', 'messages', 'first_fact_seconds'])
+
+
+# Define a function to stand up the parts of the Streamlit runtime the script runner needs (once per process)
+def setup_runtime():
+    if Runtime._instance is not None:
+        return
+    config.set_option("runner.postScriptGC", False)
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+
+class TimedScriptRunner(LocalScriptRunner):
+    # records when the script run finished and when the first fact was sent to the browser, and returns as
+    # soon as the run stops instead of polling every 100 ms like the harness does
+    def __init__(self, script_path, prev_session_state=None):
+        super().__init__(script_path, prev_session_state)
+        self._script_cache = _script_cache
+        self.finished_at = None
+        self.first_fact_at = None
+        self.stopped = threading.Event()
+        self.on_event.connect(self._record_finish, weak=False)
+
+    def _record_finish(self, sender, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS and self.finished_at is None:
+            self.finished_at = time.perf_counter()
+        if event in STOP_EVENTS:
+            self.stopped.set()
+        if event == ScriptRunnerEvent.ENQUEUE_FORWARD_MSG and self.first_fact_at is None:
+            message = kwargs['forward_msg']
+            if message.HasField('delta') and message.delta.new_element.markdown.body.startswith(FIRST_FACT_PREFIX):
+                self.first_fact_at = time.perf_counter()
+
+    def run(self, widget_state=None, timeout=60):
+        self.request_rerun(RerunData(widget_states=widget_state))
+        if not self._script_thread:
+            self.start()
+        if not self.stopped.wait(timeout):
+            self.request_stop()
+            self.join()
+            raise RuntimeError(f"the script did not finish within {timeout}s")
+        tree = parse_tree_from_messages(self.forward_msgs())
+        tree.script_path = self.script_path
+        tree._session_state = self.session_state
+        return tree
+
+
+class Session:
+    # one browser session: the element tree and session state of its last run, carried into the next one
+    def __init__(self, timeout=60):
+        setup_runtime()
+        # a new session first runs the script to get the input form
+        self.tree = TimedScriptRunner(APP_PATH).run(timeout=timeout)
+
+    # Define a function to submit one birthdate in this session and return a Render
+    def submit(self, birthdate, timeout=60):
+        year_input, month_input, day_input = self.tree.get('number_input')
+        year_input.set_value(birthdate.year)
+        month_input.set_value(birthdate.month)
+        day_input.set_value(birthdate.day)
+        self.tree.get('button')[0].click()
+        runner = TimedScriptRunner(APP_PATH, self.tree.session_state)
+        started_at = time.perf_counter()
+        self.tree = runner.run(self.tree.get_widget_states(), timeout=timeout)
+        messages = runner.forward_msgs()
+        for message in messages:
+            if message.HasField('delta') and message.delta.new_element.WhichOneof('type') == 'exception':
+                raise RuntimeError(f"main.py raised for {birthdate}: {message.delta.new_element.exception.message}")
+        if runner.finished_at is None:
+            raise RuntimeError(f"main.py did not run to the end for {birthdate}")
+        first_fact_seconds = runner.first_fact_at - started_at if runner.first_fact_at is not None else None
+        return Render(runner.finished_at - started_at, messages, first_fact_seconds)
+
+
+# Define a function to submit one birthdate in a session shared by every call (created on first use)
+def render(birthdate, timeout=60):
+    global _session
+    if _session is None:
+        _session = Session(timeout)
+    return _session.submit(birthdate, timeout)
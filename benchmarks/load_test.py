@@ -0,0 +1,133 @@
+# Load generator: many concurrent headless sessions submitting birthdates to main.py
+#
+#   python benchmarks/load_test.py --concurrency 1 2 4 8 16 --submits 20
+#   python benchmarks/load_test.py --concurrency 8 --rounds 5 --output load.json
+#
+# Every session runs the script in its own thread through Streamlit's testing harness, like the server runs
+# one script thread per browser session, fully offline. For each concurrency level it reports throughput,
+# latency percentiles, the process RSS (current and peak) and the memory growth per session. With several
+# rounds the RSS after each round shows whether memory keeps growing at a steady load (a leak).
+import argparse
+import datetime
+import json
+import resource
+import sys
+import threading
+import time
+
+import harness
+
+import numpy as np
+
+import registry
+
+# share of the population per age bracket (years), roughly a world age pyramid
+AGE_BRACKETS = [((0, 15), 0.25), ((15, 30), 0.24), ((30, 45), 0.21), ((45, 60), 0.16), ((60, 75), 0.10),
+                ((75, 100), 0.04)]
+# a concurrency level is past saturation when doubling it adds less than this share of throughput
+SATURATION_GAIN = 0.10
+
+
+# Define a function to draw birthdates with a realistic age distribution
+def sample_birthdates(count, today, rng):
+    ranges, weights = zip(*AGE_BRACKETS)
+    brackets = rng.choice(len(ranges), size=count, p=np.asarray(weights) / sum(weights))
+    ages = np.array([rng.uniform(*ranges[bracket]) for bracket in brackets])
+    earliest = datetime.date(1900, 1, 1)
+    return [max(earliest, today - datetime.timedelta(days=int(age * 365.25))) for age in ages]
+
+
+# Define a function to get the peak resident memory of the process in bytes
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Define a function to run `concurrency` sessions that each submit `submits` birthdates, one after the other
+def run_level(concurrency, submits, rng):
+    today = datetime.date.today()
+    birthdates = [sample_birthdates(submits, today, rng) for _ in range(concurrency)]
+    rss_before = registry.process_rss()
+    # sessions are opened (their first run draws the form) before the clock starts
+    sessions = [harness.Session() for _ in range(concurrency)]
+    latencies = [[] for _ in range(concurrency)]
+    errors = []
+    start = threading.Barrier(concurrency + 1)
+
+    def user(index):
+        start.wait()
+        for birthdate in birthdates[index]:
+            try:
+                latencies[index].append(sessions[index].submit(birthdate).seconds)
+            except Exception as error:
+                errors.append(f"{birthdate}: {error}")
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+    rss_after = registry.process_rss()
+
+    done = np.concatenate([np.asarray(session_latencies) for session_latencies in latencies]) * 1000
+    quantiles = np.percentile(done, [50, 95, 99]) if len(done) else [np.nan] * 3
+    return {
+        'concurrency': concurrency,
+        'submits': int(len(done)),
+        'errors': errors[:10],
+        'throughput_per_s': len(done) / elapsed,
+        'p50_ms': float(quantiles[0]),
+        'p95_ms': float(quantiles[1]),
+        'p99_ms': float(quantiles[2]),
+        'rss_bytes': rss_after,
+        'peak_rss_bytes': peak_rss(),
+        'rss_growth_per_session_bytes': (rss_after - rss_before) / concurrency if rss_before and rss_after else None,
+    }
+
+
+# Define a function to find the first concurrency level past which throughput stops growing
+def saturation_point(levels):
+    for before, after in zip(levels, levels[1:]):
+        if after['throughput_per_s'] < before['throughput_per_s'] * (1 + SATURATION_GAIN):
+            return before['concurrency']
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent-session load test of main.py')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='numbers of simultaneous sessions to try, in order')
+    parser.add_argument('--submits', type=int, default=10, help='birthdates submitted by each session')
+    parser.add_argument('--rounds', type=int, default=1, help='times every level is repeated (leak check)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # one warm-up submit so the loaders, the imports and the first figures are not part of the first level
+    harness.render(datetime.date(1990, 5, 17))
+    results = {'levels': [], 'rss_by_round': []}
+    for round_index in range(args.rounds):
+        for concurrency in args.concurrency:
+            level = run_level(concurrency, args.submits, rng)
+            level['round'] = round_index
+            results['levels'].append(level)
+            print(f"round {round_index} x{concurrency:3d}: {level['throughput_per_s']:7.1f} submits/s   "
+                  f"p50 {level['p50_ms']:8.1f} ms   p95 {level['p95_ms']:8.1f} ms   p99 {level['p99_ms']:8.1f} ms   "
+                  f"rss {level['rss_bytes'] / 2**20:7.1f} MiB   peak {level['peak_rss_bytes'] / 2**20:7.1f} MiB"
+                  + (f"   {len(level['errors'])} errors" if level['errors'] else ''))
+        results['rss_by_round'].append(registry.process_rss())
+
+    first_round = [level for level in results['levels'] if level['round'] == 0]
+    results['saturation_concurrency'] = saturation_point(first_round)
+    print(f"throughput stops growing past {results['saturation_concurrency'] or 'the highest level tried'} sessions")
+    if args.rounds > 1:
+        growth = np.diff(results['rss_by_round'])
+        print("RSS growth per round (MiB): " + ', '.join(f"{value / 2**20:.1f}" for value in growth))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if any(level['errors'] for level in results['levels']) else 0)
@@ -0,0 +1,267 @@
+# Benchmark suite for the app: per-fact latency, loaders cold and warm, cold start and full-page render
+#
+#   python benchmarks/run_benchmarks.py --output bench.json
+#   python benchmarks/run_benchmarks.py --compare bench.json --threshold 0.25
+#
+# Every metric is reported in milliseconds (median and p95 over the repeats). With --compare the run
+# fails (exit code 1) when a metric's median is more than `threshold` slower than in the baseline file.
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import harness
+from harness import REPO_DIR
+
+import numpy as np
+
+import charts
+import insights
+import registry
+import result_store
+import year_table
+from csv_reader import read_csv
+from figure_cache import figure_payload
+
+# birthdates used by every per-fact and render benchmark
+BIRTHDATES = [datetime.date(1935, 7, 4), datetime.date(1962, 2, 28), datetime.date(1990, 5, 17),
+              datetime.date(2000, 1, 1), datetime.date(2016, 12, 31)]
+TODAY = datetime.date(2026, 1, 1)
+
+# Define a function to summarize a list of durations (seconds) in milliseconds
+def summarize(durations):
+    durations_ms = np.asarray(durations) * 1000
+    return {'median_ms': float(np.median(durations_ms)), 'p95_ms': float(np.percentile(durations_ms, 95)),
+            'runs': len(durations_ms)}
+
+
+# Define a function to time a callable `repeat` times
+def time_calls(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started_at)
+    return summarize(durations)
+
+
+########################################
+# Per-fact latency: the computation and the chart of each section, for one birthdate at a time
+def bench_facts(repeat):
+    table = year_table.build_year_table(insights.load_sources(), TODAY.year)
+    avg_age_df = read_csv(os.path.join(REPO_DIR, 'Data', 'avg_age.csv'))
+    temp_df = read_csv(os.path.join(REPO_DIR, 'Data', 'world_temp.csv'))
+    today = np.datetime64(TODAY, 'D')
+
+    def fact(section):
+        def run():
+            for birthdate in BIRTHDATES:
+                dates = insights.to_dates([birthdate])
+                years = np.array([birthdate.year])
+                section(birthdate, dates, years)
+        return run
+
+    def fact1(birthdate, dates, years):
+        insights.age_breakdown(dates, today)
+
+    def fact2(birthdate, dates, years):
+        user_age = insights.age_breakdown(dates, today)['user_age'][0]
+        figure_payload(charts.average_age_figure(avg_age_df['country'], avg_age_df['avg_age'], user_age))
+
+    def fact3(birthdate, dates, years):
+        user_age = insights.age_breakdown(dates, today)['user_age']
+        planet_ages = {planet: float(ages[0]) for planet, ages in zip(insights.planet_orbital_periods,
+                                                                      insights.planet_ages(user_age).values())}
+        figure_payload(charts.planet_figure(planet_ages))
+
+    def fact4(birthdate, dates, years):
+        population = insights.population_increase(years, table)
+        if not np.isnan(population['population_increase'][0]):
+            figure_payload(charts.population_figure(population['birth_year_population'][0],
+                                                    population['population_increase'][0]))
+
+    def fact5(birthdate, dates, years):
+        insights.temperature_change(years, table)
+        figure_payload(charts.temperature_figure(temp_df['temp_year'], temp_df['no_smoothing'], birthdate.year))
+
+    def fact6(birthdate, dates, years):
+        dollar_value = insights.dollar_value(years, table)['dollar_value'][0]
+        figure_payload(charts.dollar_figure(dollar_value))
+
+    def quiz(birthdate, dates, years):
+        answers = insights.quiz_answers(dates, table)
+        for name, question in charts.QUIZ_QUESTIONS.items():
+            figure_payload(charts.quiz_figure(question, answers[name][0] or 'No data for your birth date'))
+
+    sections = {'fact1_age': fact1, 'fact2_average_age': fact2, 'fact3_planets': fact3, 'fact4_population': fact4,
+                'fact5_temperature': fact5, 'fact6_dollar': fact6, 'quiz': quiz}
+    # one untimed pass so first-call costs (Plotly validators, ...) do not land in the first section
+    for section in sections.values():
+        fact(section)()
+    metrics = {f'fact:{name}': time_calls(fact(section), repeat) for name, section in sections.items()}
+    # every fact of a birthdate at once: computed, and looked up in the precomputed result store
+    metrics['fact:all_computed'] = time_calls(
+        lambda: [insights.insights_for(birthdate, TODAY, table) for birthdate in BIRTHDATES], repeat)
+    store = result_store.ResultStore(table, TODAY)
+    metrics['fact:all_from_store'] = time_calls(lambda: [store.row(birthdate) for birthdate in BIRTHDATES], repeat)
+    metrics['result_store:build'] = time_calls(lambda: result_store.ResultStore(table, TODAY), max(1, repeat // 10))
+    durations = []
+    for _ in range(max(1, repeat // 10)):
+        stale = result_store.ResultStore(table, TODAY - datetime.timedelta(days=1))
+        started_at = time.perf_counter()
+        stale.advance(TODAY)
+        durations.append(time.perf_counter() - started_at)
+    metrics['result_store:advance_one_day'] = summarize(durations)
+    return metrics
+
+
+########################################
+# Loaders: cold is the first read in a fresh interpreter, warm a repeated read in this one
+# (each CSV parsed on its own, and all of them read from the data bundle)
+def bench_loaders(repeat):
+    metrics = {}
+    for loader, file_name in insights.DATASET_FILES.items():
+        path = os.path.join(REPO_DIR, 'Data', file_name)
+        script = ("import time; from csv_reader import read_csv; t = time.perf_counter(); "
+                  f"read_csv({path!r}); print(time.perf_counter() - t)")
+        cold = [float(subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, capture_output=True, text=True,
+                                     check=True).stdout) for _ in range(max(1, repeat // 10))]
+        metrics[f'loader_cold:{loader}'] = summarize(cold)
+        metrics[f'loader_warm:{loader}'] = time_calls(lambda: read_csv(path), repeat)
+    # what the app actually does: map the compiled bundle (already built) and read every dataset from it
+    insights.load_sources()
+    script = ("import time; t = time.perf_counter(); import insights; insights.load_sources(); "
+              "print(time.perf_counter() - t)")
+    cold = [float(subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, capture_output=True, text=True,
+                                 check=True).stdout) for _ in range(max(1, repeat // 10))]
+    metrics['loader_cold:bundle'] = summarize(cold)
+    metrics['loader_warm:bundle'] = time_calls(insights.load_sources, repeat)
+    # what every rerun of the page pays: the staleness check and a reference to the shared datasets
+    metrics['loader_warm:registry'] = time_calls(registry.current, repeat)
+    return metrics
+
+
+########################################
+# Cold start: fresh interpreters importing what main.py imports, and computing a first result headless
+# (the data path the API server and batch jobs use, which loads neither pandas nor Plotly)
+COLD_START_SCRIPTS = {
+    'imports': 'import streamlit, numpy, charts, insights, year_table, figure_cache, payload',
+    'headless_first_result': ('import datetime, insights, year_table; '
+                              'insights.insights_for(datetime.date(1990, 5, 17), datetime.date(2026, 1, 1), '
+                              'year_table.build_year_table(insights.load_sources(), 2026))'),
+}
+
+
+def bench_cold_start(repeat):
+    metrics = {}
+    for name, script in COLD_START_SCRIPTS.items():
+        durations = []
+        for _ in range(max(1, repeat // 10)):
+            started_at = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, check=True)
+            durations.append(time.perf_counter() - started_at)
+        metrics[f'cold_start:{name}'] = summarize(durations)
+    return metrics
+
+
+########################################
+# Full page: the whole script rendered headless for each birthdate, and the time until its first fact is sent
+# (the figure for progressive mode, where only the first fact is computed until a section is opened)
+def bench_render(repeat):
+    metrics = {}
+    # the first render pays for the loaders and the empty figure cache
+    started_at = time.perf_counter()
+    harness.render(BIRTHDATES[0])
+    metrics['render:first'] = summarize([time.perf_counter() - started_at])
+    for birthdate in BIRTHDATES:
+        renders = [harness.render(birthdate) for _ in range(max(1, repeat // 10))]
+        metrics[f'render:{birthdate.isoformat()}'] = summarize([render.seconds for render in renders])
+        metrics[f'first_fact:{birthdate.isoformat()}'] = summarize([render.first_fact_seconds for render in renders])
+    os.environ['AGE_INSIGHTS_PROGRESSIVE'] = '1'
+    try:
+        for birthdate in BIRTHDATES:
+            renders = [harness.render(birthdate) for _ in range(max(1, repeat // 10))]
+            metrics[f'progressive_first_fact:{birthdate.isoformat()}'] = summarize(
+                [render.first_fact_seconds for render in renders])
+            metrics[f'progressive_render:{birthdate.isoformat()}'] = summarize([render.seconds for render in renders])
+    finally:
+        del os.environ['AGE_INSIGHTS_PROGRESSIVE']
+    return metrics
+
+
+# Define a function to check every chart against charts.CHART_BUDGETS for all benchmark birthdates
+def check_chart_budgets():
+    violations = []
+    table = year_table.build_year_table(insights.load_sources(), TODAY.year)
+    avg_age_df = read_csv(os.path.join(REPO_DIR, 'Data', 'avg_age.csv'))
+    temp_df = read_csv(os.path.join(REPO_DIR, 'Data', 'world_temp.csv'))
+    for birthdate in BIRTHDATES:
+        result = insights.insights_for(birthdate, TODAY, table)
+        figures = {
+            'average_age': charts.average_age_figure(avg_age_df['country'], avg_age_df['avg_age'], result['user_age']),
+            'planets': charts.planet_figure({planet: result[f'age_on_{planet.lower()}']
+                                             for planet in insights.planet_orbital_periods}),
+            'temperature': charts.temperature_figure(temp_df['temp_year'], temp_df['no_smoothing'], birthdate.year),
+            'dollar': charts.dollar_figure(result['dollar_value']),
+            'quiz': charts.quiz_figure(charts.QUIZ_QUESTIONS['president'],
+                                       result['president'] or 'No data for your birth date'),
+        }
+        if not np.isnan(result['population_increase']):
+            figures['population'] = charts.population_figure(result['birth_year_population'], result['population_increase'])
+        for name, fig in figures.items():
+            violations.extend(charts.budget_violations(name, fig, figure_payload(fig)))
+    return violations
+
+
+# Define a function to list the metrics that got slower than the baseline by more than the threshold
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, metric in results['metrics'].items():
+        if name not in baseline['metrics']:
+            continue
+        before = baseline['metrics'][name]['median_ms']
+        after = metric['median_ms']
+        if after > before * (1 + threshold):
+            regressions.append(f"{name}: {before:.3f} ms -> {after:.3f} ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the age insights app')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median against the baseline (0.25 = 25%%)')
+    parser.add_argument('--repeat', type=int, default=50, help='number of timed runs per metric')
+    parser.add_argument('--skip', nargs='*', default=[], choices=['facts', 'loaders', 'cold_start', 'render'],
+                        help='groups of benchmarks to leave out')
+    args = parser.parse_args()
+
+    groups = {'facts': bench_facts, 'loaders': bench_loaders, 'cold_start': bench_cold_start, 'render': bench_render}
+    results = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'repeat': args.repeat},
+        'metrics': {},
+    }
+    for group, bench in groups.items():
+        if group not in args.skip:
+            results['metrics'].update(bench(args.repeat))
+    results['chart_budget_violations'] = check_chart_budgets()
+
+    for name, metric in results['metrics'].items():
+        print(f"{name:40s} median {metric['median_ms']:10.3f} ms   p95 {metric['p95_ms']:10.3f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = list(results['chart_budget_violations'])
+    if args.compare:
+        with open(args.compare) as f:
+            failures.extend(compare(results, json.load(f), args.threshold))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
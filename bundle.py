@@ -0,0 +1,314 @@
+# Compiled, memory-mapped bundle of the CSV datasets in Data/
+# The datasets are parsed once into one binary file next to the CSVs; every process maps that file read-only,
+# so they share its pages instead of each parsing the CSVs and holding its own copy.
+#
+#   python bundle.py      build (or refresh) Data/datasets.bundle and print what it holds
+#
+# Layout: MAGIC, the length of a JSON header, the header, then the column arrays, each aligned to 64 bytes.
+# Columns are stored in the smallest type that holds them: integers are downcast (int16 years), decimals are
+# float32 when that is lossless at their precision and strings are codes into one table of interned strings.
+# The header keeps the size, mtime and SHA-256 of every CSV; when a CSV changes only its dataset is parsed again.
+import csv
+import datetime
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from csv_reader import read_csv
+
+MAGIC = b'AGEBNDL\x00'
+# bumped whenever the layout changes; a bundle of another version is rebuilt from scratch
+BUNDLE_VERSION = 2
+BUNDLE_FILE = 'datasets.bundle'
+ALIGNMENT = 64
+# integer types tried in order when downcasting a column
+INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+# decimals kept exactly when a float column is narrowed to float32
+MAX_DECIMALS = 6
+
+logger = logging.getLogger(__name__)
+
+
+# Define a function to round up to the next multiple of ALIGNMENT
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# Define a function to get the SHA-256 of a file
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Define a function to turn a float32 column back into the float64 values read from the CSV
+def _widen(values, decimals):
+    return np.round(values.astype(np.float64), decimals)
+
+
+# Define a function to pick the stored form of a parsed column: (kind, array, decimals)
+def _store_column(values):
+    if values.dtype == np.int64:
+        for dtype in INT_TYPES:
+            if len(values) == 0 or (values.min() >= np.iinfo(dtype).min and values.max() <= np.iinfo(dtype).max):
+                return 'int', values.astype(dtype), None
+    if values.dtype == np.float64:
+        finite = values[~np.isnan(values)]
+        decimals = next((d for d in range(MAX_DECIMALS + 1) if np.array_equal(np.round(finite, d), finite)), None)
+        if decimals is not None and np.array_equal(_widen(values.astype(np.float32), decimals), values, equal_nan=True):
+            return 'float', values.astype(np.float32), decimals
+        return 'float', values, None
+    return 'str', values.astype(str), None
+
+
+# Define a function to get the checksum of a bundle's content: the column bytes, the interned strings and the
+# column layout (not the file stats, so touching a CSV without changing it keeps the same data version)
+def _content_checksum(header, data):
+    digest = hashlib.sha256()
+    layout = {'strings': header['strings'],
+              'columns': {name: dataset['columns'] for name, dataset in header['datasets'].items()}}
+    digest.update(json.dumps(layout, sort_keys=True).encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+# Define a function to serialize datasets ({name: {'source': ..., 'columns': {column: stored form}}})
+def _encode(datasets):
+    # one table of interned strings for the whole bundle
+    strings = {}
+    for dataset in datasets.values():
+        for kind, values, _ in dataset['columns'].values():
+            if kind == 'str':
+                for value in values:
+                    strings.setdefault(value, len(strings))
+    code_type = np.int16 if len(strings) <= np.iinfo(np.int16).max else np.int32
+
+    blobs = []
+    offset = 0
+    header = {'version': BUNDLE_VERSION, 'strings': list(strings), 'datasets': {}}
+    for name, dataset in datasets.items():
+        columns = {}
+        for column, (kind, values, decimals) in dataset['columns'].items():
+            if kind == 'str':
+                values = np.array([strings[value] for value in values], dtype=code_type)
+            offset = _align(offset)
+            columns[column] = {'kind': kind, 'dtype': values.dtype.str, 'offset': offset, 'count': len(values),
+                               'decimals': decimals}
+            blobs.append((offset, np.ascontiguousarray(values).tobytes()))
+            offset += values.nbytes
+        header['datasets'][name] = dict(dataset['source'], rows=max([c['count'] for c in columns.values()] or [0]),
+                                        columns=columns)
+
+    data = bytearray(offset)
+    for start, blob in blobs:
+        data[start:start + len(blob)] = blob
+    # the checksum covers the parsed content, so it only changes when the data does
+    header['checksum'] = _content_checksum(header, data)
+    header_bytes = json.dumps(header).encode()
+    head = MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes
+    return head + bytes(_align(len(head)) - len(head)) + bytes(data)
+
+
+class Bundle:
+    def __init__(self, buffer, path=None):
+        # buffer is a read-only mmap of the bundle file (or the bytes of a bundle that could not be written)
+        self.path = path
+        self._buffer = buffer
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a dataset bundle")
+        (length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(buffer[start:start + length]))
+        if self.header['version'] != BUNDLE_VERSION:
+            raise ValueError(f"bundle version {self.header['version']}, expected {BUNDLE_VERSION}")
+        self._data_start = _align(start + length)
+        if _content_checksum(self.header, memoryview(buffer)[self._data_start:]) != self.header['checksum']:
+            raise ValueError("bundle checksum mismatch")
+        self._strings = np.array(self.header['strings'], dtype=object)
+
+    @property
+    def checksum(self):
+        return self.header['checksum']
+
+    @property
+    def datasets(self):
+        return list(self.header['datasets'])
+
+    @property
+    def nbytes(self):
+        return len(self._buffer)
+
+    # Define a function to get a column as stored: a zero-copy, read-only view into the mapped file
+    def _raw(self, info):
+        return np.frombuffer(self._buffer, dtype=np.dtype(info['dtype']), count=info['count'],
+                             offset=self._data_start + info['offset'])
+
+    # Define a function to get the stored form of every column of a dataset (used when rebuilding)
+    def stored_columns(self, name):
+        columns = {}
+        for column, info in self.header['datasets'][name]['columns'].items():
+            values = self._raw(info)
+            if info['kind'] == 'str':
+                values = self._strings[values].astype(str)
+            columns[column] = (info['kind'], values, info['decimals'])
+        return columns
+
+    # Define a function to read a dataset like csv_reader.read_csv does
+    # integer columns are views into the mapped file; float32 columns are widened (a copy) so they keep the
+    # exact values of the CSV, and string codes are decoded to the interned strings
+    def columns(self, name):
+        columns = {}
+        for column, info in self.header['datasets'][name]['columns'].items():
+            values = self._raw(info)
+            if info['kind'] == 'str':
+                values = self._strings[values]
+            elif info['kind'] == 'float' and info['decimals'] is not None:
+                values = _widen(values, info['decimals'])
+            columns[column] = values
+        return columns
+
+    # Define a function to list the datasets whose CSV changed since the bundle was built
+    # (returns the changed names, and whether any file was touched at all so its stats need refreshing)
+    def changes(self, data_dir, files):
+        changed = []
+        touched = False
+        for name, file_name in files.items():
+            source = self.header['datasets'].get(name)
+            if source is None or source['file'] != file_name:
+                changed.append(name)
+                continue
+            path = os.path.join(data_dir, file_name)
+            stat = os.stat(path)
+            # the size and mtime are enough to tell a file is unchanged; the hash decides when they differ
+            if (stat.st_size, stat.st_mtime_ns) != (source['size'], source['mtime_ns']):
+                touched = True
+                if file_sha256(path) != source['sha256']:
+                    changed.append(name)
+        return changed, touched or set(self.header['datasets']) != set(files)
+
+
+########################################
+# Build, refresh and open the bundle
+_bundles = {}
+_lock = threading.Lock()
+
+
+# Define a function to check that every value of a column is of its kind: 'int', 'float', 'str' or a date format
+def _check_column(values, kind):
+    if kind == 'int' and values.dtype != np.int64 or kind == 'float' and values.dtype == object:
+        # read_csv fell back to a wider type, so some value is not a whole number (or not a number at all)
+        convert = int if kind == 'int' else float
+        for value in values:
+            try:
+                convert(str(value) or 'nan')
+            except ValueError:
+                raise ValueError(f"{value!r} is not {'a whole number' if kind == 'int' else 'a number'}") from None
+    elif '%' in kind:
+        for value in values:
+            datetime.datetime.strptime(str(value), kind)
+
+
+# Define a function to check that parsed columns (from read_csv) hold rows and the columns the app reads,
+# with values of their kind ({column: kind})
+def check_columns(columns, kinds, file_name):
+    missing = [column for column in kinds if column not in columns]
+    if missing:
+        raise ValueError(f"{file_name} is missing the column(s) {', '.join(missing)}")
+    if not len(next(iter(columns.values()))):
+        raise ValueError(f"{file_name} has no rows")
+    for column, kind in kinds.items():
+        try:
+            _check_column(columns[column], kind)
+        except ValueError as error:
+            raise ValueError(f"{file_name}, column {column}: {error}") from None
+
+
+# Define a function to parse a CSV and check it has the columns the app reads, with values of their kind
+def _parse(path, kinds=None):
+    columns = read_csv(path)
+    check_columns(columns, kinds or {}, os.path.basename(path))
+    return {column: _store_column(values) for column, values in columns.items()}
+
+
+# Define a function to build a bundle, parsing only the datasets not taken over from `previous`
+def build_bundle(data_dir, files, schemas=None, previous=None, changed=None):
+    schemas = schemas or {}
+    datasets = {}
+    for name, file_name in files.items():
+        path = os.path.join(data_dir, file_name)
+        stat = os.stat(path)
+        source = {'file': file_name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        reuse = previous is not None and name in previous.datasets and name not in (changed or [])
+        if not reuse:
+            try:
+                columns = _parse(path, schemas.get(name))
+                source['sha256'] = file_sha256(path)
+            except (ValueError, csv.Error) as error:
+                # a broken refresh keeps the data already in the bundle rather than taking the app down;
+                # the new stats are recorded so the file is only checked again once it is edited again
+                if previous is None or name not in previous.datasets:
+                    raise
+                logger.error("keeping the previous %s data: %s", name, error)
+                reuse = True
+            else:
+                logger.info("parsed %s for the dataset bundle", file_name)
+        if reuse:
+            columns = previous.stored_columns(name)
+            source['sha256'] = previous.header['datasets'][name]['sha256']
+        datasets[name] = {'source': source, 'columns': columns}
+    content = _encode(datasets)
+
+    path = os.path.join(data_dir, BUNDLE_FILE)
+    # written next to the old file and swapped in, so readers never see a partial bundle
+    # (processes that still map the old file keep reading it until they refresh)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(content)
+        os.replace(temporary, path)
+    except OSError as error:
+        logger.warning("could not write %s (%s), keeping the bundle in memory", path, error)
+        return Bundle(content)
+    return _map(path)
+
+
+# Define a function to map a bundle file (None when it is missing, of another version or damaged)
+def _map(path):
+    try:
+        with open(path, 'rb') as f:
+            return Bundle(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+# Define a function to get an up-to-date bundle of the given datasets, building or refreshing it when needed
+def open_bundle(data_dir, files, schemas=None):
+    path = os.path.join(data_dir, BUNDLE_FILE)
+    with _lock:
+        bundle = _bundles.get(path)
+        changed, touched = bundle.changes(data_dir, files) if bundle else (None, True)
+        if touched:
+            # another process may already have refreshed the file
+            bundle = _map(path) or bundle
+            changed, touched = bundle.changes(data_dir, files) if bundle else (None, True)
+        if touched:
+            bundle = build_bundle(data_dir, files, schemas, bundle, changed)
+        _bundles[path] = bundle
+        return bundle
+
+
+if __name__ == '__main__':
+    import insights
+
+    logging.basicConfig(level=logging.INFO)
+    bundle = open_bundle(insights.DATA_DIR, insights.DATASET_FILES, insights.DATASET_COLUMNS)
+    print(f"{bundle.path or 'in memory'}: {bundle.nbytes} bytes, checksum {bundle.checksum[:12]}")
+    for name, info in bundle.header['datasets'].items():
+        columns = ', '.join(f"{column} {'str/' if column_info['kind'] == 'str' else ''}"
+                            f"{np.dtype(column_info['dtype']).name}" for column, column_info in info['columns'].items())
+        print(f"  {name:12s} {info['file']:22s} {info['rows']:5d} rows  {columns}")
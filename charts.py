@@ -0,0 +1,242 @@
+# Figure builders for the charts in main.py
+# Each builder only takes the inputs its chart really depends on, so the result can be cached by them.
+# The number of traces of every chart is fixed: per-point styling goes into arrays, never into extra traces.
+# Plotly is only imported once a chart is actually built, so starting the app (or a cache hit) never pays for it
+import numpy as np
+
+from timeline import TIMELINES
+
+# colors shared by every chart
+PRIMARY_COLOR = '#6200EE'
+ACCENT_COLOR = '#03DAC6'
+BACKGROUND_COLOR = '#0E1117'
+
+# upper bound on traces and serialized bytes per chart, whatever the input
+CHART_BUDGETS = {
+    'average_age': {'traces': 2, 'bytes': 10000},
+    'planets': {'traces': 1, 'bytes': 10000},
+    'population': {'traces': 2, 'bytes': 10000},
+    'temperature': {'traces': 1, 'bytes': 12000},
+    'dollar': {'traces': 1, 'bytes': 10000},
+    'quiz': {'traces': 1, 'bytes': 10000},
+    'cohort_ages': {'traces': 1, 'bytes': 10000},
+}
+
+
+# Define a function to build the layout shared by every chart: transparent background and a white title
+def base_layout(title, **layout):
+    import plotly.graph_objects as go
+    return go.Layout(title=dict(text=title, font=dict(color='white')),
+                     plot_bgcolor='rgba(0,0,0,0)',
+                     paper_bgcolor='rgba(0,0,0,0)',
+                     **layout)
+
+
+# Define a function to list the budgets a figure exceeds (an empty list means it fits)
+def budget_violations(name, fig, payload):
+    budget = CHART_BUDGETS[name]
+    violations = []
+    if len(fig.data) > budget['traces']:
+        violations.append(f"{name}: {len(fig.data)} traces > {budget['traces']}")
+    if len(payload) > budget['bytes']:
+        violations.append(f"{name}: {len(payload)} bytes > {budget['bytes']}")
+    return violations
+
+
+########################################
+# Fact2: Your age compared to the average age in selected countries
+def average_age_figure(countries, avg_ages, user_age, labels=None):
+    import plotly.graph_objects as go
+    countries = np.asarray(countries, dtype=object)
+    avg_ages = np.asarray(avg_ages, dtype=np.float64)
+    # only the countries with the minimum and the maximum average age get a label
+    # (the registry precomputes these labels; they are derived here when not given)
+    if labels is None:
+        labels = np.full(len(countries), None, dtype=object)
+        labels[[avg_ages.argmin(), avg_ages.argmax()]] = countries[[avg_ages.argmin(), avg_ages.argmax()]]
+    # create a trace for the countries
+    trace_countries = go.Scatter(
+        x=avg_ages,
+        y=[1.4] * len(avg_ages),
+        mode='markers+text',
+        marker=dict(size=10, color=PRIMARY_COLOR),
+        text=labels,  # This text is always displayed next to the dot
+        textposition="top right",
+        hovertemplate="<b>%{hovertext}</b><br><br>Age: %{x}<br><extra></extra>",
+        hovertext=countries,
+        name=''
+    )
+    # create a trace for the user's age
+    trace_user = go.Scatter(
+        x=[user_age],
+        y=[1.4],
+        mode='markers+text',
+        marker=dict(size=12, color=ACCENT_COLOR),
+        text=['You'],
+        textposition="top right",
+        hovertemplate="<b>You</b><br><br>Age: %{x}<br><extra></extra>",
+        name=''
+    )
+    layout = base_layout('Your age compared to the average age in selected countries',
+                         showlegend=False,
+                         hovermode='closest',
+                         xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+                         yaxis=dict(showgrid=False, zeroline=False, showticklabels=False))
+    return go.Figure(data=[trace_countries, trace_user], layout=layout)
+
+
+########################################
+# Fact3: Your Age on Different Planets
+def planet_figure(planet_ages):
+    import plotly.graph_objects as go
+    # sort the planets by age, the smallest bar at the bottom
+    planets = sorted(planet_ages, key=planet_ages.get)
+    ages = [planet_ages[planet] for planet in planets]
+    colors = [ACCENT_COLOR if planet == 'Earth' else PRIMARY_COLOR for planet in planets]
+    # one horizontal bar trace, each bar labelled with its age in the bar's color
+    fig = go.Figure(data=[go.Bar(
+        x=ages,
+        y=planets,
+        orientation='h',
+        marker_color=colors,
+        text=[str(age) for age in ages],
+        textposition='outside',
+        textfont=dict(size=12, color=colors),
+        cliponaxis=False,
+        showlegend=False,
+        hoverinfo='none'
+    )])
+    fig.update_layout(base_layout(
+        'Your Age on Different Planets',
+        xaxis={'visible': False},  # this hides the x-axis
+        font=dict(size=14, color="Black"),
+        height=600,
+        margin=dict(l=0, r=0, t=30, b=0),
+        autosize=True,
+    ))
+    return fig
+
+
+########################################
+# Fact4: Global population and density increase since birth
+def population_figure(birth_year_pop, population_inc):
+    import plotly.graph_objects as go
+    # convert the populations into the number of dots
+    birth_dots = int(birth_year_pop / 1e8)
+    inc_dots = int(population_inc / 1e8)
+    # define the number of dots per column
+    dots_per_column = 7
+    # calculate the number of columns for each population at birth and population increase
+    birth_columns = birth_dots // dots_per_column + (birth_dots % dots_per_column > 0)
+    inc_columns = inc_dots // dots_per_column + (inc_dots % dots_per_column > 0)
+    # generate the coordinates for the population at birth
+    birth_x = np.repeat(range(birth_columns), dots_per_column)[:birth_dots]
+    birth_y = np.tile(range(dots_per_column), birth_columns)[:birth_dots]
+    # generate the coordinates for the population increase
+    inc_x = np.repeat(range(birth_columns, birth_columns + inc_columns), dots_per_column)[:inc_dots] + 1
+    inc_y = np.tile(range(dots_per_column), inc_columns)[:inc_dots]
+    # create the scatter plot for the birth population
+    trace1 = go.Scatter(x=birth_x, y=birth_y, mode='markers',
+                        marker_color=PRIMARY_COLOR, name='Population at birth',
+                        marker=dict(size=10), hoverinfo='none')
+    # create the scatter plot for the population increase
+    trace2 = go.Scatter(x=inc_x, y=inc_y, mode='markers',
+                        marker_color=ACCENT_COLOR, name='Population increase',
+                        marker=dict(size=10), hoverinfo='none')
+    layout = base_layout('World\'s population increase since your birth',
+                         xaxis=dict(showticklabels=False, zeroline=False, showgrid=False),
+                         yaxis=dict(showticklabels=False, zeroline=False, showgrid=False),
+                         showlegend=True)
+    return go.Figure(data=[trace1, trace2], layout=layout)
+
+
+########################################
+# Fact5: Global surface temperature change since birth
+def temperature_figure(temp_years, anomalies, year):
+    import plotly.graph_objects as go
+    temp_years = np.asarray(temp_years)
+    # bars before the birth year in the primary color, the rest in the accent color
+    colors = np.where(temp_years < year, 'rgb(98, 0, 238)', 'rgb(3, 218, 198)')
+    fig = go.Figure(data=[go.Bar(x=temp_years, y=anomalies, marker_color=colors)])
+    fig.update_layout(base_layout(
+        'Global temperature change since your birth',
+        xaxis_title='Year',
+        yaxis_title='Temperature (°C)',
+        font=dict(size=14, color="Black"),
+        height=600
+    ))
+    return fig
+
+
+########################################
+# Fact6: How $1 at birth worth today?
+def dollar_figure(dollar_value):
+    import plotly.graph_objects as go
+    # one trace with two bars; the y grid drawn above the bars in the page color splits the
+    # "today" bar into one segment per whole dollar without a trace per dollar
+    fig = go.Figure(data=[go.Bar(
+        x=['$1 at birth', '$1 today'],
+        y=[1, dollar_value],
+        marker_color=[PRIMARY_COLOR, ACCENT_COLOR],
+        text=['$1', f'${dollar_value} today'],
+        textposition='outside',
+        textfont=dict(size=14, color=[PRIMARY_COLOR, ACCENT_COLOR]),
+        cliponaxis=False,
+        showlegend=False,
+        hoverinfo='none'
+    )])
+    fig.update_layout(base_layout(
+        'How much $1 at birth worth today?',
+        yaxis=dict(showticklabels=False, zeroline=False, showgrid=True, dtick=1,
+                   gridcolor=BACKGROUND_COLOR, gridwidth=2, layer='above traces'),
+        showlegend=False,
+        height=400,
+        width=600,
+        xaxis=dict(visible=False),
+    ))
+    return fig
+
+
+########################################
+# It's Time for a Quiz
+# quiz questions, keyed by the timeline that answers them (registered in timeline.TIMELINES)
+QUIZ_QUESTIONS = {name: timeline[-1] for name, timeline in TIMELINES.items()}
+
+
+def quiz_figure(question, answer):
+    import plotly.graph_objects as go
+    # a single invisible point that reveals the answer on hover
+    fig = go.Figure(
+        data=[go.Scatter(x=[0], y=[0], mode='markers', marker=dict(size=1, color='black'),
+                         hovertext="<b>" + answer + "</b>", hoverinfo='text')],
+        layout=base_layout(question,
+                           height=200, width=500,
+                           xaxis=dict(visible=False),
+                           yaxis=dict(visible=False),
+                           hovermode='closest',
+                           annotations=[dict(x=0, y=0, xref='x', yref='y', text='Hover me to see the answer!',
+                                             showarrow=False, font=dict(size=15))])
+    )
+    return fig
+
+
+########################################
+# Cohort mode: how many people of the uploaded file have each age
+def cohort_age_figure(counts):
+    import plotly.graph_objects as go
+    counts = np.asarray(counts)
+    fig = go.Figure(data=[go.Bar(
+        x=np.arange(len(counts)),
+        y=counts,
+        marker_color=PRIMARY_COLOR,
+        hovertemplate="Age %{x}: %{y} people<extra></extra>",
+        showlegend=False,
+    )])
+    fig.update_layout(base_layout(
+        'Ages in your group',
+        xaxis=dict(title='Age (years)', showgrid=False),
+        yaxis=dict(title='People', showgrid=False),
+        bargap=0.1,
+        height=400,
+    ))
+    return fig
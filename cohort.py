@@ -0,0 +1,273 @@
+# Cohort mode: aggregate insights for a whole file of birthdates, in fixed-size chunks
+# A CSV or Parquet file of any size goes through a pipeline of generators, CHUNK_ROWS birthdates at a time
+# (read -> parse -> compute -> aggregate and write), so memory stays flat whatever the number of rows:
+#   - ages go into a histogram over whole months (the resolution of the age breakdown), which gives exact
+#     quantiles in constant memory; the age on every planet follows from the age
+#   - quiz answers (US president, last World Cup winner, ...) are counted per value
+#   - the facts of every row are appended to a gzipped CSV on disk as its chunk goes by
+#
+#   python cohort.py members.csv --output enriched.csv.gz [--column birthdate]
+#
+# Dates are read in ISO format (YYYY-MM-DD, anything after the day is ignored) or as Parquet date/timestamp
+# columns. Rows without a valid date between 1900-01-01 and today count as invalid and keep empty facts.
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import insights
+import registry
+from timeline import MISSING, TIMELINES
+
+# birthdates read, computed and written at a time
+CHUNK_ROWS = 50000
+FIRST_BIRTHDATE = np.datetime64('1900-01-01', 'D')
+# name of the birthdate column looked for when none is given (otherwise the first column is used)
+DEFAULT_COLUMN = 'birthdate'
+# quantiles of the age reported for the cohort
+AGE_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# answers listed per quiz question in the summary (the rest are added up as 'other')
+TOP_ANSWERS = 10
+# facts written per row of the enrichment file, after the row number and the birthdate as read
+ENRICHED_COLUMNS = ['years', 'months', 'days', 'total_days', 'user_age'] + \
+    [f'age_on_{planet.lower()}' for planet in insights.planet_orbital_periods] + \
+    ['population_increase', 'temp_change', 'dollar_value'] + list(TIMELINES)
+# digits kept for the float facts in the enrichment file
+FLOAT_DECIMALS = 4
+# the app writes the enrichment files of its sessions here and keeps the latest MAX_OUTPUT_FILES of them
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), 'age_insights_cohort')
+MAX_OUTPUT_FILES = 20
+
+
+########################################
+# Read the birthdates, one chunk at a time
+# Define a function to pick the birthdate column from a header
+def _pick_column(names, column):
+    if column is not None:
+        if column not in names:
+            raise ValueError(f"no column {column!r} in the file (columns: {', '.join(names)})")
+        return names.index(column)
+    lowered = [name.strip().lower() for name in names]
+    return lowered.index(DEFAULT_COLUMN) if DEFAULT_COLUMN in lowered else 0
+
+
+# Define a function to read the birthdate column of a CSV file (path or binary file) as chunks of strings
+def read_csv_chunks(source, column=None, chunk_rows=CHUNK_ROWS):
+    with (open(source, 'rb') if isinstance(source, str) else source) as binary:
+        text = io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+        rows = csv.reader(text)
+        header = next(rows, None)
+        if header is None:
+            return
+        index = _pick_column(header, column)
+        while True:
+            chunk = [row[index] if index < len(row) else '' for row in itertools.islice(rows, chunk_rows)]
+            if not chunk:
+                return
+            yield chunk
+
+
+# Define a function to read the birthdate column of a Parquet file (path or binary file) as chunks
+def read_parquet_chunks(source, column=None, chunk_rows=CHUNK_ROWS):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("reading Parquet files needs pyarrow (pip install pyarrow)") from None
+    parquet = pq.ParquetFile(source)
+    name = parquet.schema_arrow.names[_pick_column(parquet.schema_arrow.names, column)]
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=[name]):
+        yield batch.column(0).to_numpy(zero_copy_only=False)
+
+
+# Define a function to turn a chunk of birthdates (strings, dates or datetime64) into datetime64[D], NaT when invalid
+def parse_dates(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[D]')
+    texts = [str(value).strip()[:10] if value is not None else '' for value in values]
+    try:
+        return np.array(texts, dtype='datetime64[D]')
+    except ValueError:
+        pass
+    dates = np.full(len(texts), np.datetime64('NaT'), dtype='datetime64[D]')
+    for position, text in enumerate(texts):
+        try:
+            dates[position] = np.datetime64(text, 'D')
+        except ValueError:
+            pass
+    return dates
+
+
+########################################
+# Compute and aggregate
+# Define a function to compute the facts of every valid birthdate of every chunk
+def enrich(chunks, today, table):
+    today = np.datetime64(today, 'D')
+    for values in chunks:
+        dates = parse_dates(values)
+        valid = ~np.isnat(dates) & (dates >= FIRST_BIRTHDATE) & (dates <= today)
+        yield values, dates, valid, insights.compute_insights(dates[valid], today, table)
+
+
+class CohortSummary:
+    def __init__(self, today, table):
+        self.today = np.datetime64(today, 'D')
+        self.table = table
+        self.rows = 0
+        self.valid = 0
+        # number of people per whole month of age, up to the age of someone born on FIRST_BIRTHDATE
+        oldest = insights.age_breakdown(np.array([FIRST_BIRTHDATE]), self.today)['total_months'][0]
+        self.age_months = np.zeros(oldest + 1, dtype=np.int64)
+        # number of people per answer code of each quiz timeline (the last slot counts "no data")
+        self.answers = {name: np.zeros(len(timeline.labels) + 1, dtype=np.int64)
+                        for name, timeline in table.timelines.items()}
+        self.sums = {'dollar_value': 0.0, 'temp_change': 0.0}
+        self.counts = {'dollar_value': 0, 'temp_change': 0}
+
+    # Define a function to add the facts of one chunk
+    def update(self, dates, valid, result):
+        self.rows += len(valid)
+        self.valid += int(valid.sum())
+        self.age_months += np.bincount(result['total_months'], minlength=len(self.age_months))
+        for name, timeline in self.table.timelines.items():
+            codes = timeline.codes_at(dates[valid])
+            self.answers[name] += np.bincount(np.where(codes == MISSING, len(timeline.labels), codes),
+                                              minlength=len(self.answers[name]))
+        for name in self.sums:
+            known = result[name][~np.isnan(result[name])]
+            self.sums[name] += float(known.sum())
+            self.counts[name] += len(known)
+
+    # Define a function to get an age quantile in years, exact to the month
+    def age_quantile(self, q):
+        if not self.valid:
+            return float('nan')
+        month = int(np.searchsorted(np.cumsum(self.age_months), q * self.valid))
+        return month / 12
+
+    # Define a function to get the number of people per whole year of age
+    def age_years(self):
+        padded = np.append(self.age_months, np.zeros(-len(self.age_months) % 12, dtype=np.int64))
+        return padded.reshape(-1, 12).sum(axis=1)
+
+    # Define a function to get the most frequent answers of a quiz question, most frequent first
+    def top_answers(self, name):
+        labels = self.table.timelines[name].labels + ['No data']
+        order = np.argsort(-self.answers[name], kind='stable')
+        counts = {labels[code]: int(self.answers[name][code]) for code in order[:TOP_ANSWERS] if self.answers[name][code]}
+        other = int(self.answers[name][order[TOP_ANSWERS:]].sum())
+        if other:
+            counts['other'] = other
+        return counts
+
+    def report(self):
+        quantiles = {f'p{int(q * 100)}': self.age_quantile(q) for q in AGE_QUANTILES}
+        median = quantiles['p50']
+        ages = np.arange(len(self.age_months)) / 12
+        return {
+            'rows': self.rows,
+            'valid': self.valid,
+            'invalid': self.rows - self.valid,
+            'mean_age': float((ages * self.age_months).sum() / self.valid) if self.valid else float('nan'),
+            'age_quantiles': quantiles,
+            'median_age_on_planets': {planet: round(median / period, 2)
+                                      for planet, period in insights.planet_orbital_periods.items()},
+            'mean_dollar_value': self.sums['dollar_value'] / self.counts['dollar_value'] if self.counts['dollar_value'] else None,
+            'mean_temp_change': self.sums['temp_change'] / self.counts['temp_change'] if self.counts['temp_change'] else None,
+            'answers': {name: self.top_answers(name) for name in self.answers},
+        }
+
+
+########################################
+# Write the facts of every row
+class EnrichmentWriter:
+    def __init__(self, path):
+        # gzipped when the path ends with .gz (the fastest level: compression would take longer than the facts)
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, 'wt', compresslevel=1, newline='', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+        csv.writer(self._file).writerow(['row', 'birthdate'] + ENRICHED_COLUMNS)
+        self.rows = 0
+
+    # Define a function to append the rows of one chunk (invalid rows keep empty facts)
+    def write(self, values, valid, result):
+        columns = [np.arange(self.rows + 1, self.rows + len(values) + 1).tolist(), [str(value) for value in values]]
+        for name in ENRICHED_COLUMNS:
+            facts = result[name]
+            if facts.dtype.kind == 'f':
+                facts = np.where(np.isnan(facts), None, np.round(facts, FLOAT_DECIMALS).astype(object))
+            column = np.full(len(values), '', dtype=object)
+            column[valid] = facts
+            columns.append(column.tolist())
+        # one write per chunk rather than one per row
+        chunk = io.StringIO()
+        csv.writer(chunk).writerows(zip(*columns))
+        self._file.write(chunk.getvalue())
+        self.rows += len(values)
+
+    def close(self):
+        self._file.close()
+
+
+# Define a function to create a new enrichment file in a folder, removing the oldest ones beyond `keep`
+# (Streamlit does not tell when a session ends, so the file a session last downloaded is never deleted by it)
+def new_output_file(directory=OUTPUT_DIR, keep=MAX_OUTPUT_FILES):
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for entry in os.scandir(directory):
+        try:
+            files.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            pass
+    for _, path in sorted(files)[:max(0, len(files) - keep + 1)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    fd, path = tempfile.mkstemp(suffix='.csv.gz', dir=directory)
+    os.close(fd)
+    return path
+
+
+# Define a function to run the whole pipeline over a file; returns the summary report
+# progress(rows) is called after every chunk
+def process(source, output=None, column=None, file_format=None, today=None, chunk_rows=CHUNK_ROWS, progress=None):
+    today = today or datetime.date.today()
+    table = registry.current(today.year).year_table
+    name = source if isinstance(source, str) else getattr(source, 'name', '')
+    file_format = file_format or ('parquet' if name.lower().endswith(('.parquet', '.pq')) else 'csv')
+    reader = read_parquet_chunks if file_format == 'parquet' else read_csv_chunks
+    summary = CohortSummary(today, table)
+    writer = EnrichmentWriter(output) if output is not None else None
+    try:
+        for values, dates, valid, result in enrich(reader(source, column, chunk_rows), today, table):
+            summary.update(dates, valid, result)
+            if writer is not None:
+                writer.write(values, valid, result)
+            if progress is not None:
+                progress(summary.rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate insights for a file of birthdates')
+    parser.add_argument('path', help='CSV or Parquet file with one birthdate per row')
+    parser.add_argument('--output', help='write the facts of every row to this CSV (gzipped if it ends with .gz)')
+    parser.add_argument('--column', help=f"birthdate column (default: '{DEFAULT_COLUMN}' or the first column)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='file format (default: from the extension)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    report = process(args.path, args.output, args.column, args.format, chunk_rows=args.chunk_rows).report()
+    print(json.dumps(report, indent=2))
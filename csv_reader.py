@@ -0,0 +1,32 @@
+# Minimal CSV reader for the small files in Data/
+# Reads a file into a dict of NumPy arrays (one per column) without importing pandas
+import csv
+
+import numpy as np
+
+
+# Define a function to convert the text of one column to int64, float64 (empty -> NaN) or str values
+def _convert(values):
+    try:
+        return np.array([int(value) for value in values], dtype=np.int64)
+    except ValueError:
+        pass
+    try:
+        return np.array([float(value) if value else np.nan for value in values], dtype=np.float64)
+    except ValueError:
+        return np.array(values, dtype=object)
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.reader(f) if any(cell.strip() for cell in row)]
+    if not rows:
+        raise ValueError(f"{path} is empty")
+    header = [name.strip() for name in rows[0]]
+    columns = {}
+    for i, name in enumerate(header):
+        # trailing separators leave unnamed, empty columns behind
+        if not name:
+            continue
+        columns[name] = _convert([row[i].strip() if i < len(row) else '' for row in rows[1:]])
+    return columns
@@ -0,0 +1,92 @@
+# Bounded LRU cache of serialized Plotly figures
+# Charts are keyed by the minimal inputs they depend on, so a hit skips both figure construction
+# and JSON encoding
+import json
+import threading
+from collections import OrderedDict
+
+
+# the config every chart of the app is shown with
+CHART_CONFIG = {'displayModeBar': False, 'showLink': False, 'linkText': False}
+
+
+# Define a function to serialize a figure exactly like st.plotly_chart does
+def figure_payload(fig):
+    import plotly.utils
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+########################################
+# Send a serialized figure to the browser
+# st.plotly_chart validates and encodes the figure on every call; a cached payload is sent as is instead, in the
+# message st.plotly_chart would build. This mirrors streamlit/elements/plotly_chart.py::marshall of Streamlit
+# 1.24.1 (sharing='streamlit', theme='streamlit', use_container_width=False) and goes through the private
+# DeltaGenerator._enqueue, so it only holds for the pinned version: tests/test_show_chart.py compares it with
+# marshall and renders a cached chart through the app, and fails when a Streamlit upgrade changes either.
+# Define a function to build the PlotlyChart message of a payload
+def plotly_chart_proto(payload, config=CHART_CONFIG):
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+    proto = PlotlyChartProto()
+    proto.use_container_width = False
+    proto.figure.spec = payload
+    proto.figure.config = json.dumps(config)
+    proto.theme = 'streamlit'
+    return proto
+
+
+# Define a function to show a payload where the script is writing (the main area, an expander, a column, ...)
+def show_payload(payload, config=CHART_CONFIG):
+    import streamlit as st
+    st._main._enqueue('plotly_chart', plotly_chart_proto(payload, config))
+
+
+class FigureCache:
+    def __init__(self, maxsize=1024, serialize=figure_payload):
+        self.maxsize = maxsize
+        # figure_payload, or payload.compact_payload in compact mode
+        self.serialize = serialize
+        self._payloads = OrderedDict()
+        # sessions run in their own threads and share one cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Define a function to return the cached payload for a key, building and storing it on a miss
+    def get_or_build(self, key, build):
+        return self.get_or_render(key, lambda: self.serialize(build()))
+
+    # Define a function to return the cached payload for a key, calling render for the payload on a miss
+    # (for payloads serialized elsewhere, such as in a figure worker)
+    def get_or_render(self, key, render):
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        # build outside the lock so a slow figure does not stall the other sessions
+        payload = render()
+        with self._lock:
+            self._payloads[key] = payload
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+                self.evictions += 1
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._payloads),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': sum(len(payload) for payload in self._payloads.values()),
+            }
@@ -0,0 +1,145 @@
+# Chart building and serialization in a pool of worker processes
+# Building and JSON-encoding a Plotly figure is pure Python that holds the GIL, so within one Streamlit process
+# the charts of all sessions are built one at a time. With AGE_INSIGHTS_FIGURE_POOL=1 they are built in worker
+# processes instead. A worker gets only the chart's cache key (the chart name and the age, birth year or quiz
+# answer it depends on) plus the data version. It reads the datasets from the mapped bundle itself and returns
+# the serialized figure, ready to send. The session thread waits without holding the GIL, so throughput grows
+# with the number of cores.
+#
+#   AGE_INSIGHTS_FIGURE_POOL=1       build the charts in worker processes
+#   AGE_INSIGHTS_FIGURE_WORKERS=4    number of workers (default: the cores this process may run on)
+#
+# A chart is built in the session's own process when the worker has another data version, crashed or timed out.
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import charts
+import insights
+import registry
+from figure_cache import figure_payload
+from payload import compact_payload
+
+# seconds a session waits for a worker before building the chart itself
+TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+
+class StaleDataError(Exception):
+    pass
+
+
+########################################
+# Build a chart from its cache key (in a worker or in the session's process)
+# Define a function to build the figure of a chart key from the datasets
+def build_figure(key, datasets):
+    chart, value = key
+    if chart == 'average_age':
+        ages = datasets['ages']
+        return charts.average_age_figure(ages['country'], ages['avg_age'], value, ages['label'])
+    if chart == 'planets':
+        ages = insights.planet_ages(value)
+        return charts.planet_figure({planet: float(ages[f'age_on_{planet.lower()}'])
+                                     for planet in insights.planet_orbital_periods})
+    if chart == 'temperature':
+        temperature = datasets['temperature']
+        return charts.temperature_figure(temperature['temp_year'], temperature['no_smoothing'], value)
+    birth_years = np.array([value])
+    if chart == 'population':
+        population = insights.population_increase(birth_years, datasets.year_table)
+        return charts.population_figure(float(population['birth_year_population'][0]),
+                                        float(population['population_increase'][0]))
+    if chart == 'dollar':
+        return charts.dollar_figure(float(insights.dollar_value(birth_years, datasets.year_table)['dollar_value'][0]))
+    # quiz charts are keyed by the timeline that answers them
+    return charts.quiz_figure(charts.QUIZ_QUESTIONS[chart], value)
+
+
+# Define a function to build and serialize a chart in a worker, on the session's data version only
+def _render(key, compact, version, last_year):
+    datasets = registry.current(last_year)
+    if datasets.version != version:
+        raise StaleDataError(f"worker data {datasets.version[:12]} != session data {version[:12]}")
+    return (compact_payload if compact else figure_payload)(build_figure(key, datasets))
+
+
+# Define a function to pay for the imports and the datasets when a worker starts, not on its first chart
+def _warm_up():
+    import plotly.graph_objects  # noqa: F401
+    import plotly.utils  # noqa: F401
+    registry.current()
+
+
+# Define a function to get the number of cores this process may run on
+def worker_count():
+    configured = os.environ.get('AGE_INSIGHTS_FIGURE_WORKERS')
+    if configured:
+        return max(1, int(configured))
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class FigurePool:
+    def __init__(self, workers=None):
+        self.workers = workers or worker_count()
+        # workers are spawned: forking a process that runs Streamlit's threads is not safe
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_warm_up)
+        self.built = 0
+        self.fallbacks = 0
+
+    # Define a function to build and serialize a chart in a worker, or here when the worker cannot
+    def render(self, key, compact, datasets):
+        try:
+            payload = self._executor.submit(_render, key, compact, datasets.version, datasets.last_year).result(TIMEOUT)
+            self.built += 1
+            return payload
+        except StaleDataError:
+            # the data changed between the session's run and the worker's; the next call catches up
+            pass
+        except BrokenProcessPool:
+            logger.warning("a figure worker died, building %s in the session", key[0])
+            _discard(self)
+        except TimeoutError:
+            logger.warning("no figure worker answered within %ss, building %s in the session", TIMEOUT, key[0])
+        self.fallbacks += 1
+        return (compact_payload if compact else figure_payload)(build_figure(key, datasets))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {'workers': self.workers, 'built': self.built, 'fallbacks': self.fallbacks}
+
+
+########################################
+# The pool of this process, started on first use
+_pool = None
+_lock = threading.Lock()
+
+
+# Define a function to get the pool, starting it on first use
+def current():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = FigurePool()
+            logger.info("figure pool: %d worker processes", _pool.workers)
+        return _pool
+
+
+# Define a function to drop a broken pool, so the next call starts a new one
+def _discard(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown()
@@ -0,0 +1,60 @@
+# Prefix-sum inflation engine for any number of CPI series
+# Cumulative log-factors are stored per currency and year, so the value in year B of 1 unit
+# from year A is exp(L[B + 1] - L[A]) for whole arrays of A at once
+import numpy as np
+
+DEFAULT_CURRENCY = 'USD'
+
+
+class InflationEngine:
+    def __init__(self, series):
+        # series maps a currency code to (years, yearly inflation rates in percent)
+        self.currencies = list(series)
+        self.codes = {currency: code for code, currency in enumerate(self.currencies)}
+        all_years = np.concatenate([np.asarray(years, dtype=np.int64) for years, _ in series.values()])
+        self.first_year = int(all_years.min())
+        self.last_year = int(all_years.max())
+        # rates of years a series does not cover count as 0% (a factor of 1)
+        log_factors = np.zeros((len(self.currencies), self.last_year - self.first_year + 1))
+        for code, (years, rates) in enumerate(series.values()):
+            positions = np.asarray(years, dtype=np.int64) - self.first_year
+            log_factors[code, positions] = np.log1p(np.asarray(rates, dtype=np.float64) / 100)
+        # cumulative[c, i] is the sum of the log-factors of the years before first_year + i
+        self.cumulative = np.zeros((len(self.currencies), log_factors.shape[1] + 1))
+        np.cumsum(log_factors, axis=1, out=self.cumulative[:, 1:])
+
+    # Define a function to map years to prefix positions, clipping to the covered range
+    def _positions(self, years):
+        return np.clip(np.asarray(years, dtype=np.int64) - self.first_year, 0, self.cumulative.shape[1] - 1)
+
+    # Define a function to map a currency code, or an array of them, to matrix rows
+    def rows(self, currency):
+        if isinstance(currency, str):
+            return self.codes[currency]
+        currencies, inverse = np.unique(np.asarray(currency, dtype=str), return_inverse=True)
+        return np.array([self.codes[c] for c in currencies], dtype=np.int64)[inverse]
+
+    # Define a function to get the value at the end of to_year of 1 unit from the start of from_year
+    def value(self, currency, from_years, to_year):
+        rows = self.rows(currency)
+        log_growth = self.cumulative[rows, self._positions(np.asarray(to_year) + 1)] - \
+            self.cumulative[rows, self._positions(from_years)]
+        return np.exp(log_growth)
+
+
+########################################
+# Read the data
+def build_inflation_engine(columns):
+    # columns is a dict of arrays (csv_reader) or a DataFrame; a 'currency' column holds several
+    # series in one long file, without one the file is the US series
+    years = np.asarray(columns['year'], dtype=np.float64)
+    rates = np.asarray(columns['inflation_rate'], dtype=np.float64)
+    if 'currency' in columns:
+        currencies = np.asarray(columns['currency']).astype(str)
+    else:
+        currencies = np.full(len(years), DEFAULT_CURRENCY)
+    keep = ~np.isnan(years) & ~np.isnan(rates)
+    # series keep the order in which they first appear in the file
+    return InflationEngine({currency: (years[keep & (currencies == currency)].astype(np.int64),
+                                       rates[keep & (currencies == currency)])
+                            for currency in dict.fromkeys(currencies[keep])})
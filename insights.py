@@ -0,0 +1,200 @@
+# Headless compute layer for the facts shown in main.py
+# Every function here works on whole arrays of birthdates at once and never touches Streamlit
+import datetime
+import os
+
+import numpy as np
+
+from bundle import open_bundle
+from inflation import DEFAULT_CURRENCY
+from timeline import TIMELINES
+from year_table import MISSING, build_year_table
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data')
+
+# every dataset in Data/ the app depends on
+DATASET_FILES = {
+    'population': 'world_population.csv',
+    'temperature': 'world_temp.csv',
+    'inflation': 'inflation.csv',
+    'presidents': 'USpresidents.csv',
+    'world_cup': 'world_cup.csv',
+    'economies': 'economies.csv',
+    'ages': 'avg_age.csv',
+}
+
+# the columns read from each dataset and what they hold: 'int', 'float', 'str' or, for a date, its strptime format
+# a CSV without them, or with a value that does not parse, is rejected when the data bundle is built
+DATASET_COLUMNS = {
+    'population': {'year': 'int', 'population': 'int', 'density': 'int'},
+    'temperature': {'temp_year': 'int', 'no_smoothing': 'float'},
+    'inflation': {'year': 'int', 'inflation_rate': 'float'},
+    'presidents': {'president': 'str'},
+    'world_cup': {'winner': 'str'},
+    'economies': {'2nd': 'str'},
+    'ages': {'country': 'str', 'avg_age': 'float'},
+}
+# the date column of every timeline is checked against the format it is read with
+for source, date_column, date_format, _, _ in TIMELINES.values():
+    DATASET_COLUMNS[source][date_column] = date_format
+
+planet_orbital_periods = {
+    "Mercury": 0.241,
+    "Venus": 0.615,
+    "Earth": 1,
+    "Mars": 1.881,
+    "Jupiter": 11.86,
+    "Saturn": 29.46,
+    "Uranus": 84.02,
+    "Neptune": 164.8,
+}
+
+########################################
+# Read the data
+def load_sources(data_dir=DATA_DIR, names=None):
+    # read every dataset (or only the given ones) from the data bundle, rebuilt first if a CSV changed
+    bundle = open_bundle(data_dir, DATASET_FILES, DATASET_COLUMNS)
+    return {name: bundle.columns(name) for name in (DATASET_FILES if names is None else names)}
+
+
+# Define a function to get the version of the data: the checksum of the bundle, which changes with any CSV
+def data_version(data_dir=DATA_DIR):
+    return open_bundle(data_dir, DATASET_FILES, DATASET_COLUMNS).checksum
+
+
+# Define a function to turn dates, strings or datetime64 values into a datetime64[D] array
+def to_dates(birthdates):
+    if isinstance(birthdates, (datetime.date, str, np.datetime64)):
+        birthdates = [birthdates]
+    return np.asarray(birthdates, dtype='datetime64[D]')
+
+
+########################################
+# Fact1: Calculate the age in different units
+# Define a function to move dates by whole months, keeping the day of the month (the last day when the month is
+# shorter, so a January 31st birthday falls on February 28th or 29th)
+def add_months(dates, months):
+    first = dates.astype('datetime64[M]') + months
+    month_length = ((first + 1).astype('datetime64[D]') - first.astype('datetime64[D]')).astype(np.int64)
+    day = (dates - dates.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+    return first.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def age_breakdown(birthdates, today):
+    # exact calendar age: whole months since the birth month, one less when this month's anniversary is still ahead
+    total_months = (today.astype('datetime64[M]') - birthdates.astype('datetime64[M]')).astype(np.int64)
+    total_months = total_months - (add_months(birthdates, total_months) > today)
+    years, months = np.divmod(total_months, 12)
+    days = (today - add_months(birthdates, total_months)).astype(np.int64)
+    total_days = (today - birthdates).astype(np.int64)
+    return {
+        'years': years,
+        'months': months,
+        'days': days,
+        'total_months': total_months,
+        'total_days': total_days,
+        # the dates carry no time of day, so there is no hours part of the age; the total counts the hours up to
+        # today's midnight (the page ticks the rest)
+        'total_hours': total_days * 24,
+        'user_age': years + months / 12,
+    }
+
+
+########################################
+# Fact3: Your Age on Different Planets
+def planet_ages(user_age):
+    # one column per planet, rounded like the chart labels
+    return {f'age_on_{planet.lower()}': np.round(user_age / period, 2)
+            for planet, period in planet_orbital_periods.items()}
+
+
+########################################
+# Fact4: Global population and density increase since birth
+def population_increase(birth_years, table):
+    # years without data hold the MISSING sentinel and come back as NaN
+    birth_year_population = table.column('population', birth_years).astype(np.float64)
+    birth_year_density = table.column('density', birth_years).astype(np.float64)
+    birth_year_population[birth_year_population == MISSING] = np.nan
+    birth_year_density[birth_year_density == MISSING] = np.nan
+    population_inc = table.latest_population - birth_year_population
+    density_inc = table.latest_density - birth_year_density
+    return {
+        'birth_year_population': birth_year_population,
+        'current_year_population': np.full(birth_years.shape, float(table.latest_population)),
+        'population_increase': population_inc,
+        'density_increase': density_inc,
+        'population_increase_percentage': population_inc / birth_year_population * 100,
+        'density_increase_percentage': density_inc / birth_year_density * 100,
+    }
+
+
+########################################
+# Fact5: Global surface temperature change since birth
+def temperature_change(birth_years, table):
+    # years without a measurement come back as NaN
+    return {'temp_change': table.latest_temp_anomaly - table.column('temp_anomaly', birth_years)}
+
+
+########################################
+# Fact6: How $1 at birth worth today?
+def dollar_value(birth_years, table, currency=DEFAULT_CURRENCY):
+    if currency == DEFAULT_CURRENCY:
+        factor = table.column('inflation_factor', birth_years)
+    else:
+        factor = table.inflation.value(currency, birth_years, table.last_year)
+    return {'dollar_value': np.round(factor, 2)}
+
+
+########################################
+# It's Time for a Quiz
+def quiz_answers(birthdates, table):
+    # the entry of every registered timeline in effect at the exact birthdate
+    # (US president, last World Cup winner, second-largest economy, ...)
+    # a timeline dated by bare years only changes on January 1st, so its answer is a lookup in the year table;
+    # the others (a president takes office on any day) are searched at the exact date
+    birthdates = np.asarray(birthdates, dtype='datetime64[D]')
+    birth_years = birthdates.astype('datetime64[Y]').astype(np.int64) + 1970
+    return {name: table.decode(name, table.column(name, birth_years)) if TIMELINES[name][2] == '%Y'
+            else timeline.at(birthdates) for name, timeline in table.timelines.items()}
+
+
+########################################
+# Compute every fact for an array of birthdates in one pass
+# Define a function to compute the facts that change with today's date (the others only change with the data)
+def date_dependent_facts(birthdates, today):
+    # birthdates in the future get no meaningful facts
+    result = {'valid': birthdates <= today}
+    result.update(age_breakdown(birthdates, today))
+    result.update(planet_ages(result['user_age']))
+    return result
+
+
+# Define a function to compute every fact for an array of birthdates
+def compute_insights(birthdates, today=None, table=None, currency=DEFAULT_CURRENCY):
+    birthdates = to_dates(birthdates)
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    birth_years = birthdates.astype('datetime64[Y]').astype(np.int64) + 1970
+    if table is None:
+        current_year = int(today.astype('datetime64[Y]').astype(np.int64)) + 1970
+        table = build_year_table(load_sources(), current_year)
+    result = {
+        'birthdate': birthdates,
+        'birth_year': birth_years,
+    }
+    result.update(date_dependent_facts(birthdates, today))
+    result.update(population_increase(birth_years, table))
+    result.update(temperature_change(birth_years, table))
+    result.update(dollar_value(birth_years, table, currency))
+    result.update(quiz_answers(birthdates, table))
+    return result
+
+
+# Define a function to take one row of a column-oriented result as plain Python values
+def result_row(result, position=0):
+    return {key: (values[position].item() if isinstance(values[position], np.generic) else values[position])
+            for key, values in result.items()}
+
+
+# Define a function to compute the facts for a single birthdate as plain Python values
+def insights_for(birthdate, today=None, table=None, currency=DEFAULT_CURRENCY):
+    return result_row(compute_insights([birthdate], today, table, currency))
@@ -0,0 +1,72 @@
+# Live age counter that ticks in the browser
+# The birthdate is sent once, inside a small HTML component; from then on the page's own clock updates the exact
+# calendar age (years, months, days, hours, minutes, seconds) every second without running the script again.
+# It counts from midnight of the birthdate in the visitor's time zone, with the same month arithmetic as
+# insights.age_breakdown: a birthday on a day the month does not have falls on the month's last day.
+HEIGHT = 60
+
+# the calendar age in JavaScript, shared with the static pages (see static_export.py)
+AGE_FUNCTIONS = '''
+// the birthdate moved by whole months, on the month's last day when it is shorter
+function addMonths(year, month, day, months) {
+    const first = new Date(year, month - 1 + months, 1);
+    const length = new Date(first.getFullYear(), first.getMonth() + 1, 0).getDate();
+    return new Date(first.getFullYear(), first.getMonth(), Math.min(day, length));
+}
+
+// whole days from one local midnight to another, whatever daylight saving time did in between
+function daysBetween(start, end) {
+    return Math.round((Date.UTC(end.getFullYear(), end.getMonth(), end.getDate()) -
+        Date.UTC(start.getFullYear(), start.getMonth(), start.getDate())) / 86400000);
+}
+
+// the exact calendar age on the day of `now`
+function calendarAge(year, month, day, now) {
+    const today = new Date(now.getFullYear(), now.getMonth(), now.getDate());
+    let totalMonths = (today.getFullYear() - year) * 12 + today.getMonth() - (month - 1);
+    if (addMonths(year, month, day, totalMonths) > today) {
+        totalMonths -= 1;
+    }
+    return {
+        years: Math.floor(totalMonths / 12),
+        months: totalMonths % 12,
+        days: daysBetween(addMonths(year, month, day, totalMonths), today),
+        totalMonths: totalMonths,
+        totalDays: daysBetween(new Date(year, month - 1, day), today),
+    };
+}
+
+function plural(value, unit) {
+    return '<b>' + value + ' ' + unit + (value === 1 ? '' : 's') + '</b>';
+}
+
+// the sentence the counter shows, down to the second
+function liveAge(year, month, day, now) {
+    const age = calendarAge(year, month, day, now);
+    return 'Right now you are ' + [
+        plural(age.years, 'year'), plural(age.months, 'month'), plural(age.days, 'day'),
+        plural(now.getHours(), 'hour'), plural(now.getMinutes(), 'minute')].join(', ') +
+        ' and ' + plural(now.getSeconds(), 'second') + ' old.';
+}
+'''
+
+TEMPLATE = '''
+<div id="age" style="font-family: 'Source Sans Pro', sans-serif; font-size: 16px; color: #FFFFFF;"></div>
+<script>
+%(functions)s
+function tick() {
+    document.getElementById('age').innerHTML = liveAge(%(year)d, %(month)d, %(day)d, new Date());
+}
+
+tick();
+setInterval(tick, 1000);
+</script>
+'''
+
+
+# Define a function to show the ticking age of a birthdate
+def live_age(birthdate):
+    # imported here so the static export can share AGE_FUNCTIONS without importing Streamlit
+    import streamlit.components.v1 as components
+    components.html(TEMPLATE % {'functions': AGE_FUNCTIONS, 'year': birthdate.year, 'month': birthdate.month,
+                                'day': birthdate.day}, height=HEIGHT)
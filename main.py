@@ -1,9 +1,33 @@
 # Import libraries
-import pandas as pd
+import startup
+startup.begin_run()
 import numpy as np
 import streamlit as st
+import csv
 import datetime
-import plotly.graph_objects as go
+import logging
+import os
+import time
+run_started_at = time.perf_counter()
+import charts
+import cohort
+import figure_pool
+import insights
+import metrics
+import profiling
+import refresher
+import registry
+import result_store
+from figure_cache import FigureCache, figure_payload, show_payload
+from live_age import live_age
+from payload import PayloadBudget, compact_payload
+startup.mark('imports_done')
+# timing spans and the /metrics endpoint, when enabled (see metrics.py)
+metrics.serve()
+# background refresh of Data/ from the upstream sources, when enabled (see refresher.py)
+refresher.start()
+
+logger = logging.getLogger(__name__)
 
 # Background and text color
 page_bg_img = '''
@@ -22,46 +46,34 @@ st.title('Through the Time Lens: Your Age Revisited')
 
 ########################################
 # Read the data
-@st.cache_data()
-def load_data():
-    pop = pd.read_csv('Data/world_population.csv')
-    return pop
-
-@st.cache_data()
-def load_ages():
-    avg_age = pd.read_csv('Data/avg_age.csv')
-    return avg_age
-
-@st.cache_data()
-def load_temperature_data():
-    return pd.read_csv('Data/world_temp.csv')
-
-@st.cache_data()
-def presidents_data():
-    return pd.read_csv('Data/USpresidents.csv')
-
-@st.cache_data()
-def world_cup_data():
-    return pd.read_csv("Data/world_cup.csv")
-
-@st.cache_data()
-def economies_data():
-    return pd.read_csv("Data/economies.csv")
-
-@st.cache_data()
-def inflation_data():
-    return pd.read_csv('Data/inflation.csv')
-
-planet_orbital_periods = {
-    "Mercury": 0.241,
-    "Venus": 0.615,
-    "Earth": 1,
-    "Mars": 1.881,
-    "Jupiter": 11.86,
-    "Saturn": 29.46,
-    "Uranus": 84.02,
-    "Neptune": 164.8,
-}
+# every session shares the same read-only datasets, loaded once per data version (see registry.py);
+# an edited CSV in Data/ is picked up by the next run without restarting the app
+with metrics.span('datasets'):
+    datasets = registry.current()
+
+# one bounded cache of serialized figures per process and data version
+@st.cache_resource(max_entries=1)
+def load_figure_cache(compact, version):
+    figures = FigureCache(maxsize=1024, serialize=metrics.timed('serialize', compact_payload if compact else figure_payload))
+    metrics.register('figure_cache', figures.stats)
+    return figures
+
+# compact mode shrinks the chart JSON sent to the browser; the budget caps the chart bytes per page
+compact_mode = os.environ.get('AGE_INSIGHTS_COMPACT', '') == '1'
+payload_budget = int(os.environ.get('AGE_INSIGHTS_PAYLOAD_BUDGET', 0)) or None
+# result store mode precomputes the facts of every valid birthdate, so a submit is a row lookup
+result_store_mode = os.environ.get('AGE_INSIGHTS_RESULT_STORE', '') == '1'
+if result_store_mode:
+    # built by the first run of the process, advanced by the first run of each new day
+    result_store.current(datasets.year_table, datetime.date.today())
+# progressive mode renders the age breakdown at once and every later section only when it is asked for
+progressive_mode = os.environ.get('AGE_INSIGHTS_PROGRESSIVE', '') == '1'
+# figure pool mode builds and serializes the charts in worker processes (see figure_pool.py)
+figure_pool_mode = os.environ.get('AGE_INSIGHTS_FIGURE_POOL', '') == '1'
+if figure_pool_mode:
+    metrics.register('figure_pool', figure_pool.current().stats)
+# cohort mode takes a whole file of birthdates and shows aggregate insights (see cohort.py)
+cohort_mode = os.environ.get('AGE_INSIGHTS_COHORT', '') == '1'
 
 ########################################
 # Prepare the user input form
@@ -72,488 +84,188 @@ with st.form("my_form"):
     submit_button = st.form_submit_button("Submit")
 
 ########################################
-# Define a function to calculate global population and density increase during the user's lifetime
-def get_population_and_density_increase(year):
-    pop = load_data()
-    # get the population and density for the birth year
-    birth_year_data = pop[pop['year'] == year]
-    if birth_year_data.empty:
-        return None, None, None, None
-    birth_year_population = int(birth_year_data.iloc[0]['population'])
-    birth_year_density = int(birth_year_data.iloc[0]['density'])
-    # get the latest year in the dataset, which should be the current year
-    curr_year = pop['year'].max()
-    # get the population and density for the current year
-    curr_year_data = pop[pop['year'] == curr_year]
-    curr_year_population = int(curr_year_data.iloc[0]['population'])
-    curr_year_density = int(curr_year_data.iloc[0]['density'])
-    # calculate the population and density increase
-    population_increase = curr_year_population - birth_year_population
-    density_increase = curr_year_density - birth_year_density
-    # calculate the population and density increase in percentages
-    population_increase_percentage = (population_increase / birth_year_population) * 100
-    density_increase_percentage = (density_increase / birth_year_density) * 100
-    # return the results
-    return population_increase, density_increase, population_increase_percentage, density_increase_percentage, curr_year_population, birth_year_population
-
-# Define a function to plot the population increase
-def plot_population_increase(birth_year_pop, population_inc):
-    # convert the populations into the number of dots
-    birth_dots = int(birth_year_pop / 1e8)
-    inc_dots = int(population_inc / 1e8)
-    # define the number of dots per column
-    dots_per_column = 7
-    # calculate the number of columns for each population at birth and population increase
-    birth_columns = birth_dots // dots_per_column + (birth_dots % dots_per_column > 0)
-    inc_columns = inc_dots // dots_per_column + (inc_dots % dots_per_column > 0)
-    # generate the coordinates for the population at birth
-    birth_x = np.repeat(range(birth_columns), dots_per_column)[:birth_dots]
-    birth_y = np.tile(range(dots_per_column), birth_columns)[:birth_dots]
-    # generate the coordinates for the population increase
-    inc_x = np.repeat(range(birth_columns, birth_columns + inc_columns), dots_per_column)[:inc_dots] + 1
-    inc_y = np.tile(range(dots_per_column), inc_columns)[:inc_dots]
-    # create the scatter plot for the birth population
-    trace1 = go.Scatter(x=birth_x, y=birth_y, mode='markers',
-                        marker_color='#6200EE', name='Population at birth',
-                        marker=dict(size=10), hoverinfo='none')
-    # create the scatter plot for the population increase
-    trace2 = go.Scatter(x=inc_x, y=inc_y, mode='markers',
-                        marker_color='#03DAC6', name='Population increase',
-                        marker=dict(size=10), hoverinfo='none')
-    # combine the plots
-    data = [trace1, trace2]
-    # create a layout
-    layout = go.Layout(title=dict(text='World\'s population increase since your birth', font=dict(color='white')),
-                       xaxis=dict(showticklabels=False, zeroline=False, showgrid=False),
-                       yaxis=dict(showticklabels=False, zeroline=False, showgrid=False),
-                       plot_bgcolor='rgba(0,0,0,0)',
-                       paper_bgcolor='rgba(0,0,0,0)',
-                       showlegend=True)
-    # combine data and layout into a figure
-    fig = go.Figure(data=data, layout=layout)
-    # display the plot in Streamlit
-    st.plotly_chart(fig, config={'displayModeBar': False})
+# Define a function to display the chart of a key (chart name, the value it depends on) from the figure cache,
+# within the page payload budget (see figure_cache.show_payload)
+def show_chart(key):
+    with metrics.span(f'chart:{key[0]}'):
+        if figure_pool_mode:
+            payload = figures.get_or_render(key, metrics.timed(
+                f'build:{key[0]}', lambda: figure_pool.current().render(key, compact_mode, datasets)))
+        else:
+            payload = figures.get_or_build(key, metrics.timed(
+                f'build:{key[0]}', lambda: figure_pool.build_figure(key, datasets)))
+    metrics.observe('figure_bytes', len(payload), chart=key[0])
+    if not page_budget.add(key[0], payload):
+        st.caption("This chart was left out to keep the page light.")
+        return
+    show_payload(payload)
+    startup.mark('first_render')
 
 ########################################
-# When the submit button is clicked
-if submit_button:
-    # convert the user input into a datetime object
-    birthdate = datetime.date(year, month, day)
-    # get current date
-    now = datetime.datetime.now().date()
-    # what if the chosen birthdate is in the future
-    if birthdate > now:
-        st.write("Please enter a date that is not in the future.")
-    else:
-
-        ########################################
-        # Fact1: Calculate the age in different units
-
-        # calculate the time difference
-        time_difference = now - birthdate
-        # calculate total seconds
-        total_seconds = time_difference.total_seconds()
-        # calculate age in years, months, days, and hours
-        years = int(total_seconds / (60*60*24*365.25))
-        remaining_seconds = total_seconds - (years * 60*60*24*365.25)
-        months = int(remaining_seconds / (60*60*24*30.44))
-        remaining_seconds = remaining_seconds - (months * 60*60*24*30.44)
-        days = int(remaining_seconds / (60*60*24))
-        remaining_seconds = remaining_seconds - (days * 60*60*24)
-        hours = int(remaining_seconds / (60*60))
-        # display the age in years, months, days, and hours
-        st.write("")
-        st.write("")
-        st.write(f"You are **{years} years**, **{months} months**, and **{days} days** old.")
-        st.write(f"In total, you are approximately **{years*12 + months} months** old, or **{years*365 + months*30 + days} days** old, or **{years*8760 + months*730 + days*24 + hours} hours** old.")
-
-        ########################################
-        # Fact2: Show the population increase since birth
-
-        # read the average age data
-        avg_age_df = load_ages()
-        # convert years and months to a decimal value representing age
-        user_age = years + months / 12
-        # initialize label column for the plot
-        avg_age_df['label'] = None
-        # find the index of countries with the minimum and the maximum average age
-        min_age_index = avg_age_df['avg_age'].idxmin()
-        max_age_index = avg_age_df['avg_age'].idxmax()
-        # set the label for these countries
-        avg_age_df.loc[min_age_index, 'label'] = avg_age_df.loc[min_age_index, 'country']
-        avg_age_df.loc[max_age_index, 'label'] = avg_age_df.loc[max_age_index, 'country']
-        # create a trace for the countries
-        trace_countries = go.Scatter(
-            x=avg_age_df['avg_age'],
-            y=[1.4] * len(avg_age_df),
-            mode='markers+text',
-            marker=dict(
-                size=10,
-                color='#6200EE'
-            ),
-            text=avg_age_df['label'],  # This text is always displayed next to the dot
-            textposition="top right",
-            hovertemplate=
-            "<b>%{hovertext}</b><br><br>" +
-            "Age: %{x}<br>" +
-            "<extra></extra>",
-            hovertext=avg_age_df['country'],
-            name=''
-        )
-        # create a trace for the user's age
-        trace_user = go.Scatter(
-            x=[user_age],
-            y=[1.4],
-            mode='markers+text',
-            marker=dict(
-                size=12,
-                color='#03DAC6'
-            ),
-            text=['You'],
-            textposition="top right",
-            hovertemplate=
-            "<b>You</b><br><br>" +
-            "Age: %{x}<br>" +
-            "<extra></extra>",
-            name=''
-        )
-        # create the layout
-        layout = go.Layout(title=dict(text='Your age compared to the average age in selected countries', font=dict(color='white')),
-            showlegend=False,
-            hovermode='closest',
-            yaxis=dict(
-                showgrid=False,
-                zeroline=False,
-                showticklabels=False
-            ),
-            xaxis=dict(
-                showgrid=False,
-                zeroline=False,
-                showticklabels=False
-            ),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
-        # add the traces to the figure
-        fig = go.Figure(data=[trace_countries, trace_user], layout=layout)
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+# Fact1: Calculate the age in different units
+def fact1(result, birthdate):
+    years, months, days = result['years'], result['months'], result['days']
+    # display the age in years, months, days, and hours
+    st.write("")
+    st.write("")
+    st.write(f"You are **{years} years**, **{months} months**, and **{days} days** old.")
+    st.write(f"In total, you are **{result['total_months']} months** old, or **{result['total_days']} days** old, or **{result['total_hours']} hours** old.")
+    # the exact age down to the second, kept up to date by the browser (no rerun needed to watch it move)
+    live_age(birthdate)
 
-        # mention the source of the data
-        st.markdown(
-            "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.worlddata.info/average-age.php' target='_blank'>WorldData.info</a></p>",
-            unsafe_allow_html=True)
-        st.write("")
-        st.write("")
-
-        ########################################
-        # Fact3: Your Age on Different Planets
+########################################
+# Fact2: Show the population increase since birth
+def fact2(result, birthdate):
+    # decimal value representing age (whole months, so charts can be cached by it)
+    user_age = result['user_age']
+    # display the plot in Streamlit, against the average age data
+    show_chart(('average_age', user_age))
+
+    # mention the source of the data
+    st.markdown(
+        "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.worlddata.info/average-age.php' target='_blank'>WorldData.info</a></p>",
+        unsafe_allow_html=True)
+    st.write("")
+    st.write("")
 
-        # calculate age equivalent on each planet
-        planet_ages = {planet: round(user_age / period, 2) for planet, period in planet_orbital_periods.items()}
-        # create DataFrame from the dictionary
-        planet_ages_df = pd.DataFrame.from_records(list(planet_ages.items()), columns=['Planet', 'Age'])
-        # sort DataFrame by the planet's orbital period
-        planet_ages_df = planet_ages_df.sort_values(by='Age')
-        # prepare colors list for the plot
-        planet_order = ['Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune']
-        colors = ['#03DAC6' if planet == 'Earth' else '#6200EE' for planet in planet_order]
-        # create horizontal bar plot
-        fig = go.Figure()
-        for i, row in planet_ages_df.iterrows():
-            fig.add_trace(go.Bar(
-                x=[row['Age']],
-                y=[row['Planet']],
-                orientation='h',
-                marker_color=colors[i],  # set color of the bars
-                showlegend=False,  # hide the legend
-                hoverinfo='none'
-            ))
-            fig.add_annotation(
-                x=row['Age'] + 4,  # shift the text a bit to the right
-                y=row['Planet'],
-                text=str(row['Age']),
-                font=dict(
-                    size=12,
-                    color=colors[i]  # match the color with the bars
-                ),
-                showarrow=False
-            )
-        # customize the layout
-        fig.update_layout(
-            title=dict(text='Your Age on Different Planets', font=dict(color='white')),
-            xaxis_title='',
-            xaxis={'visible': False},  # this hides the x-axis
-            yaxis_title='',
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=14, color="Black"),
-            height=600,
-            margin=dict(l=0, r=0, t=30, b=0),
-            autosize=True,
-        )
-        # display plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+########################################
+# Fact3: Your Age on Different Planets
+def fact3(result, birthdate):
+    # display plot in Streamlit (the age equivalent on each planet follows from the age)
+    show_chart(('planets', result['user_age']))
+
+    # mention the source of the data
+    st.markdown(
+        "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://spaceplace.nasa.gov/years-on-other-planets/en/' target='_blank'>NASA</a></p>",
+        unsafe_allow_html=True)
+    st.write("")
+    st.write("")
 
-        # mention the source of the data
-        st.markdown(
-            "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://spaceplace.nasa.gov/years-on-other-planets/en/' target='_blank'>NASA</a></p>",
-            unsafe_allow_html=True)
-        st.write("")
+########################################
+# Fact4: Global population and density increase since birth
+def fact4(result, birthdate):
+    # get the data
+    population_inc = result['population_increase']
+    # display the results (years without data come back as NaN)
+    if not np.isnan(population_inc):
+        st.write(
+            f"Since you were born, the world's population has increased by approximately **{population_inc/1000000.0:.2f} million** people ({result['population_increase_percentage']:.2f}%).")
         st.write("")
-
-        ########################################
-        # Fact4: Global population and density increase since birth
-
-        # get the data
-        population_inc, density_inc, population_inc_percentage, density_inc_percentage, current_year_pop, birth_year_pop = get_population_and_density_increase(
-            year)
-        # display the results
-        if population_inc is not None:
-            st.write(
-                f"Since you were born, the world's population has increased by approximately **{population_inc/1000000.0:.2f} million** people ({population_inc_percentage:.2f}%).")
-            st.write("")
-            st.write(
-                f"The world's population density has increased by approximately **{density_inc} people/sq. km** ({density_inc_percentage:.2f}%).")
-        else:
-            st.write("Data for the entered birth year is not available.")
+        st.write(
+            f"The world's population density has increased by approximately **{int(result['density_increase'])} people/sq. km** ({result['density_increase_percentage']:.2f}%).")
         # plot the population increase
-        plot_population_increase(birth_year_pop, population_inc)
-
-        # mention the source of the data with small font and hyperlink
-        st.markdown(
-            "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.worldometers.info/world-population/' target='_blank'>Worldometers</a></p>",
-            unsafe_allow_html=True)
-        st.write("")
-        st.write("")
+        show_chart(('population', birthdate.year))
+    else:
+        st.write("Data for the entered birth year is not available.")
 
-        ########################################
-        # Fact5: Global surface temperature change since birth
+    # mention the source of the data with small font and hyperlink
+    st.markdown(
+        "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.worldometers.info/world-population/' target='_blank'>Worldometers</a></p>",
+        unsafe_allow_html=True)
+    st.write("")
+    st.write("")
 
-        # load the temperature data
-        temp_df = load_temperature_data()
-        # calculate temperature change from year of birth to the last recorded year
-        temp_change = temp_df[temp_df['temp_year'] == temp_df['temp_year'].max()]['no_smoothing'].values[0] - \
-                      temp_df[temp_df['temp_year'] == year]['no_smoothing'].values[0]
-        # display the temperature change
+########################################
+# Fact5: Global surface temperature change since birth
+def fact5(result, birthdate):
+    # temperature change from year of birth to the last recorded year
+    temp_change = result['temp_change']
+    # display the temperature change
+    if not np.isnan(temp_change):
         st.write(f'The global surface temperature has changed by {temp_change:.2f}°C since your birth year.')
-        # prepare colors list for the plot
-        colors = ['rgb(98, 0, 238)' if x < year else 'rgb(3, 218, 198)' for x in temp_df['temp_year']]
-        # create the bar chart
-        fig = go.Figure(data=[go.Bar(
-            x=temp_df['temp_year'],
-            y=temp_df['no_smoothing'],
-            marker_color=colors  # set color of the bars
-        )])
-        # customize the layout
-        fig.update_layout(
-            title=dict(text='Global temperature change since your birth', font=dict(color='white')),
-            xaxis_title='Year',
-            yaxis_title='Temperature (°C)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=14, color="Black"),
-            height=600
-        )
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
-
-        # mention the source of the data
-        st.markdown("<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://data.giss.nasa.gov/gistemp/graphs/graph_data/Global_Mean_Estimates_based_on_Land_and_Ocean_Data/graph.txt' target='_blank'>NASA Global Climate Change</a></p>", unsafe_allow_html=True)
-        st.write("")
-        st.write("")
-
-        ########################################
-        # Fact6: How $1 at birth worth today?
-
-        # read the data
-        inflation_df = inflation_data()
-        # get user's birth year
-        user_birth_year = year
-        # get current year
-        current_year = datetime.datetime.now().year
-        # filter the dataframe to get inflation rates from birth year to current year
-        inflation_df = inflation_df[(inflation_df['year'] >= user_birth_year) & (inflation_df['year'] <= current_year)]
-        # convert inflation rates to fractions (i.e., 2% becomes 0.02)
-        inflation_df['inflation_rate'] = inflation_df['inflation_rate'].apply(lambda x: x / 100)
-        # calculate the current value of a dollar at birth year
-        dollar_value = 1
-        for i in inflation_df['inflation_rate']:
-            dollar_value *= (1 + i)
-        # round the dollar value to 2 decimal places
-        dollar_value = round(dollar_value, 2)
-        # prepare the bar chart
-        left_bar = go.Bar(name='$1 at birth', x=['$1 at birth'], y=[1], marker_color='#6200EE', hoverinfo='none')
-        right_bars = [go.Bar(name='', x=['$1 today'], y=[1], marker_color='#03DAC6', showlegend=False, hoverinfo='none') for i in
-                      range(int(dollar_value))]
-        if dollar_value % 1 != 0:
-            right_bars.append(
-                go.Bar(name='', x=['$1 today'], y=[dollar_value % 1], marker_color='#03DAC6', showlegend=False, hoverinfo='none'))
-        # create the bar chart
-        fig = go.Figure(data=[left_bar] + right_bars)
-        # add labels
-        fig.add_annotation(
-            x='1 today',
-            y=dollar_value,
-            text=f'${dollar_value} today',
-            showarrow=False,
-            font=dict(size=14, color='#03DAC6'),
-            yshift=15
-        )
-        fig.add_annotation(
-            x='$1 at birth',
-            y=1,
-            text='$1',
-            showarrow=False,
-            font=dict(size=14, color='#6200EE'),
-            yshift=15
-        )
-        # update the layout and add title
-        fig.update_layout(
-            barmode='stack',
-            yaxis=dict(visible=False),
-            showlegend=False,
-            height=400,
-            width=600,
-            xaxis=dict(visible=False),
-            title=dict(text='How much $1 at birth worth today?', font=dict(color='white')),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+    else:
+        st.write("Temperature data for the entered birth year is not available.")
+    # display the plot in Streamlit, against the temperature data
+    show_chart(('temperature', birthdate.year))
 
-        # mention the source of the data
-        st.markdown(
-            "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.macrotrends.net/countries/USA/united-states/inflation-rate-cpi' target='_blank'>Macrotrends</a></p>",
-            unsafe_allow_html=True)
-        st.write("")
-        st.write("")
+    # mention the source of the data
+    st.markdown("<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://data.giss.nasa.gov/gistemp/graphs/graph_data/Global_Mean_Estimates_based_on_Land_and_Ocean_Data/graph.txt' target='_blank'>NASA Global Climate Change</a></p>", unsafe_allow_html=True)
+    st.write("")
+    st.write("")
 
-        ########################################
-        # It's Time for a Quiz
-
-        # section title
-        st.markdown("<p style='text-align: left; font-size: 22px; font-weight: bold;'>It's Quiz time!</p>", unsafe_allow_html=True)
+########################################
+# Fact6: How $1 at birth worth today?
+def fact6(result, birthdate):
+    # display the plot in Streamlit: current value of a dollar at birth year, rounded to 2 decimal places
+    show_chart(('dollar', birthdate.year))
+
+    # mention the source of the data
+    st.markdown(
+        "<p style='text-align: center; font-size: 9px; color: #808080;'>Data Source: <a href='https://www.macrotrends.net/countries/USA/united-states/inflation-rate-cpi' target='_blank'>Macrotrends</a></p>",
+        unsafe_allow_html=True)
+    st.write("")
+    st.write("")
 
-        # Question 1: The US president at birth
-        # read the data
-        presidents_df = presidents_data()
-        # convert the appointment date to datetime
-        presidents_df['appointment_date'] = pd.to_datetime(presidents_df['appointment_date'], format="%m/%d/%Y")
-        # get the president at birth
-        user_birth_date = datetime.datetime(year, month, day)
-        president_at_birth = presidents_df.loc[(presidents_df['appointment_date'] <= user_birth_date)].iloc[-1]
-        # create a plotly chart
-        fig = go.Figure(
-            data=[go.Scatter(x=[0], y=[0], mode='markers', marker=dict(size=1, color='black'))],
-            layout=go.Layout(height=200, width=500,
-                title=dict(text='Guess who was the US president at your birth?', font=dict(color='white')),
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                hovermode='closest',
-                annotations=[
-                    dict(
-                        x=0,
-                        y=0,
-                        xref='x',
-                        yref='y',
-                        text='Hover me to see the answer!',
-                        showarrow=False,
-                        font=dict(
-                            size=15
-                        )
-                    )
-                ]
-            )
-        )
-        # set the hover text
-        fig.data[0].hovertext = president_at_birth['president']
-        # do not show coordinates on hover
-        fig.data[0].hoverinfo = 'text'
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+########################################
+# It's Time for a Quiz
+def quiz(result, birthdate):
+    # section title
+    st.markdown("<p style='text-align: left; font-size: 22px; font-weight: bold;'>It's Quiz time!</p>", unsafe_allow_html=True)
+
+    # one hover-to-reveal chart per question, answered by the timeline of the same name
+    for name in charts.QUIZ_QUESTIONS:
+        with metrics.span(f'quiz:{name}'):
+            show_chart((name, result[name] or 'No data for your birth date'))
+
+# the sections of the result page in order, with the button that opens them in progressive mode
+# (None: always shown)
+sections = {
+    'fact1': (fact1, None),
+    'fact2': (fact2, 'your age compared to other countries'),
+    'fact3': (fact3, 'your age on other planets'),
+    'fact4': (fact4, 'the population increase'),
+    'fact5': (fact5, 'the temperature change'),
+    'fact6': (fact6, 'what $1 is worth today'),
+    'quiz': (quiz, 'the quiz'),
+}
 
-        # Question 2: The last World Cup winner
-        # load the data
-        world_cup_df = world_cup_data()
-        # extract the last World Cup winner at the year of birth
-        last_winner = world_cup_df[world_cup_df["year"] <= year].iloc[-1]
-        # create a plotly chart
-        fig = go.Figure(
-            data=[go.Scatter(x=[0], y=[0], mode='markers', marker=dict(size=1, color='black'))],
-            layout=go.Layout(height=200, width=500,
-                             title=dict(text='Guess who was the last FIFA World Cup winner at your birth?', font=dict(color='white')),
-                             xaxis=dict(visible=False),
-                             yaxis=dict(visible=False),
-                             plot_bgcolor='rgba(0,0,0,0)',
-                             paper_bgcolor='rgba(0,0,0,0)',
-                             hovermode='closest',
-                             annotations=[
-                                 dict(
-                                     x=0,
-                                     y=0,
-                                     xref='x',
-                                     yref='y',
-                                     text='Hover me to see the answer!',
-                                     showarrow=False,
-                                     font=dict(
-                                         size=15
-                                     )
-                                 )
-                             ]
-                             )
-        )
-        # set the hover text
-        fig.data[0].hovertext = "<b>" + last_winner['winner'] + "</b>"
-        # do not show coordinates
-        fig.data[0].hoverinfo = 'text'
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+########################################
+# When the submit button is clicked
+if submit_button:
+    # convert the user input into a datetime object
+    birthdate = datetime.date(year, month, day)
+    # get current date
+    now = datetime.datetime.now().date()
+    # what if the chosen birthdate is in the future
+    if birthdate > now:
+        st.write("Please enter a date that is not in the future.")
+        st.session_state.pop('birthdate', None)
+    else:
+        # remembered so progressive mode can keep the page up while its sections are opened
+        st.session_state['birthdate'] = birthdate
+        st.session_state['open_sections'] = []
 
-        # Question 3: The second-largest economy
-        # read data
-        economies_df = economies_data()
-        # convert the 'year' column in the file to datetime
-        economies_df['year'] = pd.to_datetime(economies_df['year'], format="%Y")
-        # convert the birthdate to datetime
-        user_birth_date = datetime.datetime(year, month, day)
-        # find values for the closest year before or at birth (the file contains data for every 5 years)
-        closest_year = economies_df.loc[(economies_df['year'] <= user_birth_date)]['year'].max()
-        second_largest_economy = economies_df.loc[economies_df['year'] == closest_year].iloc[0]['2nd']
-        # create a plotly chart
-        fig = go.Figure(
-            data=[go.Scatter(x=[0], y=[0], mode='markers', marker=dict(size=1, color='black'))],
-            layout=go.Layout(height=200, width=500,
-                             title=dict(text='Guess the second largest economy by average GDP at your birth?', font=dict(color='white')),
-                             xaxis=dict(visible=False),
-                             yaxis=dict(visible=False),
-                             plot_bgcolor='rgba(0,0,0,0)',
-                             paper_bgcolor='rgba(0,0,0,0)',
-                             hovermode='closest',
-                             annotations=[
-                                 dict(
-                                     x=0,
-                                     y=0,
-                                     xref='x',
-                                     yref='y',
-                                     text='Hover me to see the answer!',
-                                     showarrow=False,
-                                     font=dict(
-                                         size=15
-                                     )
-                                 )
-                             ]
-                             )
-        )
-        # set the hover text
-        fig.data[0].hovertext = "<b>" + second_largest_economy + "</b>"
-        # do not show coordinates on hover
-        fig.data[0].hoverinfo = 'text'
-        # display the plot in Streamlit
-        st.plotly_chart(fig, config={'displayModeBar': False})
+if 'birthdate' in st.session_state and (submit_button or progressive_mode):
+    birthdate = st.session_state['birthdate']
+    now = datetime.datetime.now().date()
+    page_started_at = time.perf_counter()
+    # profile this page when asked to (see profiling.py)
+    capture = profiling.start(birthdate) if profiling.requested(st.experimental_get_query_params()) else None
+    try:
+        # compute every fact for the birthdate in one pass
+        with metrics.span('compute'):
+            if result_store_mode:
+                result = result_store.current(datasets.year_table, now).row(birthdate)
+            else:
+                result = insights.insights_for(birthdate, now, datasets.year_table)
+        # serialized charts shared by all sessions, and the byte budget of this page
+        figures = load_figure_cache(compact_mode, datasets.version)
+        page_budget = PayloadBudget(payload_budget)
+
+        for name, (section, label) in sections.items():
+            opened = not progressive_mode or label is None or name in st.session_state['open_sections']
+            # a section opened by its button stays open on the next runs
+            if not opened:
+                slot = st.empty()
+                if slot.button(f"Show {label}", key=f'show_{name}'):
+                    slot.empty()
+                    st.session_state['open_sections'].append(name)
+                    opened = True
+            if opened:
+                with metrics.span(name):
+                    section(result, birthdate)
+            if name == 'fact1':
+                metrics.observe('time_to_first_fact_seconds', time.perf_counter() - run_started_at)
 
         ########################################
         # The author
@@ -563,3 +275,68 @@ if submit_button:
         st.write("")
         st.write("")
         st.markdown("<p style='text-align: right; font-size: 14px; color: #808080;'>Author: <a href='https://www.linkedin.com/in/zakaria-chbani-475134167/' target='_blank'>Zakaria Chbani</a></p>", unsafe_allow_html=True)
+        # log the bytes shipped per chart and for the whole page
+        logger.info("chart payload: %s", page_budget.report())
+        metrics.observe('page_bytes', page_budget.total)
+        metrics.observe('section_seconds', time.perf_counter() - page_started_at, section='page')
+        metrics.export()
+    finally:
+        # stopped even when a section raises, so tracemalloc never keeps tracing the process
+        if capture is not None:
+            profiling.stop(capture)
+    # log the cold start of the process once, after its first full page
+    if startup.mark('run_done'):
+        logger.info("cold start: %s", startup.report())
+
+########################################
+# Cohort mode: aggregate insights for a whole file of birthdates
+# Define a function to show the summary of an analyzed file and the download of its facts per row
+def show_cohort(name, report, age_years, output):
+    st.write(f"**{report['valid']:,}** birthdates analyzed in {name}"
+             + (f" ({report['invalid']:,} rows without a valid birthdate were skipped)." if report['invalid'] else "."))
+    if not report['valid']:
+        return
+    quantiles = report['age_quantiles']
+    st.write(f"Median age: **{quantiles['p50']:.1f} years** (half of the group is between {quantiles['p25']:.1f} and "
+             f"{quantiles['p75']:.1f}), mean age: **{report['mean_age']:.1f} years**.")
+    st.write("Median age on other planets: " + ", ".join(
+        f"{planet} **{age}**" for planet, age in report['median_age_on_planets'].items() if planet != 'Earth') + ".")
+    st.plotly_chart(charts.cohort_age_figure(age_years))
+    for timeline_name, question in charts.QUIZ_QUESTIONS.items():
+        # the question without its 'Guess': only the first letter is raised, so 'US' and 'FIFA' stay as they are
+        heading = question.replace('Guess ', '')
+        st.write(f"**{heading[:1].upper() + heading[1:]}**")
+        st.write("\n".join(f"- {answer}: {count:,}" for answer, count in report['answers'][timeline_name].items()))
+    if not os.path.exists(output):
+        st.write("The facts of every row were cleaned up; analyze the file again to download them.")
+        return
+    with open(output, 'rb') as f:
+        st.download_button("Download the facts of every row (CSV, gzipped)", f,
+                           file_name=f"{os.path.splitext(name)[0]}-insights.csv.gz", mime='application/gzip')
+
+if cohort_mode:
+    with st.expander("Insights for a whole group: upload a file of birthdates"):
+        upload = st.file_uploader("CSV or Parquet file with one birthdate (YYYY-MM-DD) per row", type=['csv', 'parquet'])
+        column = st.text_input("Birthdate column (leave empty for 'birthdate' or the first column)")
+        if upload is not None and st.button("Analyze the file"):
+            status = st.empty()
+            # the facts per row go to a file on disk, one chunk at a time
+            output = cohort.new_output_file()
+            summary = None
+            try:
+                summary = cohort.process(upload, output, column.strip() or None,
+                                         progress=lambda rows: status.write(f"{rows:,} rows processed..."))
+            except (ValueError, ImportError, csv.Error) as error:
+                status.error(f"This file could not be read: {error}")
+            finally:
+                # whatever stopped the analysis, its partial output goes
+                if summary is None:
+                    os.remove(output)
+            if summary is not None:
+                status.empty()
+                # the previous file of this session is replaced
+                if 'cohort' in st.session_state and os.path.exists(st.session_state['cohort'][3]):
+                    os.remove(st.session_state['cohort'][3])
+                st.session_state['cohort'] = (upload.name, summary.report(), summary.age_years(), output)
+        if 'cohort' in st.session_state:
+            show_cohort(*st.session_state['cohort'])
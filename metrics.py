@@ -0,0 +1,185 @@
+# Timing spans, latency summaries and a Prometheus text exposition of them
+# Collection is off unless AGE_INSIGHTS_METRICS=1. When it is off span() hands back one shared no-op context
+# manager, timed() returns the function unchanged and observe() returns at once, so the instrumentation
+# costs next to nothing and can stay in the code (and on in production).
+#
+#   AGE_INSIGHTS_METRICS=1                  collect
+#   AGE_INSIGHTS_METRICS_FILE=metrics.prom  write the exposition to this file after every result page
+#   AGE_INSIGHTS_METRICS_PORT=9102          serve it on http://127.0.0.1:9102/metrics
+import contextlib
+import functools
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PREFIX = 'age_insights'
+QUANTILES = (0.5, 0.95, 0.99)
+# samples kept per series for the quantiles (the count and the sum cover every sample)
+WINDOW = 2048
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Summary:
+    def __init__(self):
+        # ring buffer of the latest WINDOW samples
+        self.samples = np.zeros(WINDOW)
+        self.size = 0
+        self.next = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples[self.next] = value
+        self.next = (self.next + 1) % WINDOW
+        self.size = min(self.size + 1, WINDOW)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        if not self.size:
+            return [math.nan] * len(QUANTILES)
+        return np.quantile(self.samples[:self.size], QUANTILES).tolist()
+
+
+# Define a function to format a label set the Prometheus way
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    def __init__(self, enabled=False, file=None, port=None):
+        self.enabled = enabled
+        self.file = file
+        self.port = port
+        # (metric name, sorted label pairs) -> Summary
+        self._summaries = {}
+        # name -> function returning a dict of numbers, read at exposition time
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def from_env(cls):
+        port = os.environ.get('AGE_INSIGHTS_METRICS_PORT')
+        return cls(enabled=os.environ.get('AGE_INSIGHTS_METRICS', '') == '1',
+                   file=os.environ.get('AGE_INSIGHTS_METRICS_FILE') or None,
+                   port=int(port) if port else None)
+
+    # Define a function to record one sample of a summary (seconds, bytes, ...)
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = Summary()
+            summary.observe(value)
+
+    # Define a function to time a named section: with metrics.span('fact1'): ...
+    def span(self, section):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(section)
+
+    @contextlib.contextmanager
+    def _span(self, section):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('section_seconds', time.perf_counter() - started_at, section=section)
+
+    # Define a function to wrap a function in a span (the function itself when collection is off)
+    def timed(self, section, function):
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self._span(section):
+                return function(*args, **kwargs)
+        return wrapper
+
+    # Define a function to register (or replace) a source of gauges, such as the stats of a cache
+    # a source reporting 'hits' and 'misses' also gets a '<name>_hit_ratio' gauge
+    def register(self, name, collect):
+        self._collectors[name] = collect
+
+    # Define a function to render every metric in the Prometheus text format
+    def exposition(self):
+        lines = []
+        with self._lock:
+            summaries = sorted(self._summaries.items())
+            by_name = {}
+            for (name, pairs), summary in summaries:
+                by_name.setdefault(name, []).append((pairs, summary.quantiles(), summary.sum, summary.count))
+        for name, series in by_name.items():
+            lines.append(f'# TYPE {PREFIX}_{name} summary')
+            for pairs, quantiles, total, count in series:
+                for quantile, value in zip(QUANTILES, quantiles):
+                    lines.append(f'{PREFIX}_{name}{_labels(pairs + (("quantile", quantile),))} {value:.9g}')
+                lines.append(f'{PREFIX}_{name}_sum{_labels(pairs)} {total:.9g}')
+                lines.append(f'{PREFIX}_{name}_count{_labels(pairs)} {count}')
+        for source, collect in sorted(self._collectors.items()):
+            values = {key: value for key, value in collect().items() if isinstance(value, (int, float))}
+            if 'hits' in values and 'misses' in values:
+                lookups = values['hits'] + values['misses']
+                values['hit_ratio'] = values['hits'] / lookups if lookups else 0.0
+            for key, value in values.items():
+                lines.append(f'# TYPE {PREFIX}_{source}_{key} gauge')
+                lines.append(f'{PREFIX}_{source}_{key} {value:.9g}')
+        return '\n'.join(lines) + '\n'
+
+    # Define a function to write the exposition to the configured file (replaced atomically)
+    def export(self):
+        if not self.enabled or not self.file:
+            return
+        temporary = f'{self.file}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.exposition())
+        os.replace(temporary, self.file)
+
+    # Define a function to serve the exposition on the configured port from a background thread (once)
+    def serve(self):
+        if not self.enabled or not self.port or self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                found = self.path == '/metrics'
+                body = metrics.exposition().encode() if found else b''
+                self.send_response(200 if found else 404)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        with self._lock:
+            if self._server is None:
+                self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+                threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+
+########################################
+# The metrics of this process, configured from the environment
+DEFAULT = Metrics.from_env()
+observe = DEFAULT.observe
+span = DEFAULT.span
+timed = DEFAULT.timed
+register = DEFAULT.register
+exposition = DEFAULT.exposition
+export = DEFAULT.export
+serve = DEFAULT.serve
@@ -0,0 +1,110 @@
+# Compact chart payloads and a per-page byte budget
+# Compact mode rewrites a figure spec before it is sent to the browser:
+#   - the 4 KB Plotly template embedded in every figure is replaced by a tiny shared one, and layout
+#     values it already sets are dropped from the figure
+#   - per-point color strings become small integer codes plus a colorscale
+#   - float arrays are rounded and the JSON has no whitespace
+#   - properties equal to their Plotly default are removed
+import json
+
+import numpy as np
+
+# the layout every chart shares (see charts.base_layout); the Streamlit front end merges its theme into
+# template.layout, so the template has to be present even when it is small
+COMPACT_TEMPLATE = {'layout': {
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'title': {'font': {'color': 'white'}},
+}}
+
+# properties whose value is the Plotly default and can be left out, checked against the schema of the plotly.js
+# bundled with Streamlit 1.24.1; layout.autosize (default false), layout.showlegend and the orientation of a
+# trace (both worked out from the data when missing) have no such default and are always sent
+DEFAULT_TRACE_VALUES = {'showlegend': True, 'visible': True}
+DEFAULT_LAYOUT_VALUES = {'hovermode': 'closest'}
+
+# digits kept in float arrays (the data itself has at most 4 decimals)
+FLOAT_DECIMALS = 4
+
+
+# Define a function to remove from `values` everything `defaults` already sets to the same value
+def _drop_shared(values, defaults):
+    for key, default in defaults.items():
+        if key not in values:
+            continue
+        if isinstance(default, dict) and isinstance(values[key], dict):
+            _drop_shared(values[key], default)
+            if not values[key]:
+                del values[key]
+        elif values[key] == default:
+            del values[key]
+
+
+# Define a function to replace a list of color strings by integer codes and a stepped colorscale
+def _compact_colors(marker):
+    colors = marker.get('color')
+    if isinstance(colors, np.ndarray):
+        colors = colors.tolist()
+    if not isinstance(colors, (list, tuple)) or not colors or not isinstance(colors[0], str):
+        return
+    palette, codes = np.unique(np.asarray(colors), return_inverse=True)
+    if len(palette) == 1:
+        marker['color'] = str(palette[0])
+        return
+    if len(palette) > 8:
+        return
+    # every code lands exactly on a colorscale stop, so there is no interpolation
+    stops = np.linspace(0, 1, len(palette))
+    marker['color'] = codes.astype(np.int8)
+    marker['colorscale'] = [[float(stop), str(color)] for stop, color in zip(stops, palette)]
+    marker['cmin'] = 0
+    marker['cmax'] = len(palette) - 1
+
+
+# Define a function to round the float arrays of a trace
+def _round_arrays(values):
+    for key, value in values.items():
+        if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+            values[key] = np.round(value, FLOAT_DECIMALS)
+        elif isinstance(value, dict):
+            _round_arrays(value)
+
+
+# Define a function to serialize a figure in compact form
+def compact_payload(fig):
+    import plotly.utils
+    spec = fig.to_plotly_json()
+    for trace in spec['data']:
+        if 'marker' in trace:
+            _compact_colors(trace['marker'])
+        _round_arrays(trace)
+        _drop_shared(trace, DEFAULT_TRACE_VALUES)
+    layout = spec['layout']
+    layout.pop('template', None)
+    _drop_shared(layout, COMPACT_TEMPLATE['layout'])
+    _drop_shared(layout, DEFAULT_LAYOUT_VALUES)
+    layout['template'] = COMPACT_TEMPLATE
+    return json.dumps(spec, cls=plotly.utils.PlotlyJSONEncoder, separators=(',', ':'))
+
+
+class PayloadBudget:
+    def __init__(self, limit=None):
+        # limit is the total number of chart bytes allowed on one page (None for no limit)
+        self.limit = limit
+        self.figure_bytes = {}
+        self.skipped = []
+
+    @property
+    def total(self):
+        return sum(self.figure_bytes.values())
+
+    # Define a function to account for a chart, returning False when it would exceed the budget
+    def add(self, name, payload):
+        if self.limit is not None and self.total + len(payload) > self.limit:
+            self.skipped.append(name)
+            return False
+        self.figure_bytes[name] = len(payload)
+        return True
+
+    def report(self):
+        return {'figures': dict(self.figure_bytes), 'total': self.total, 'limit': self.limit, 'skipped': list(self.skipped)}
@@ -0,0 +1,120 @@
+# On-demand profiling of one result page
+# A capture records a cProfile call graph of the script thread only (so Streamlit's own threads stay out of it)
+# and a tracemalloc snapshot of what was allocated meanwhile, then writes them next to a short text summary:
+#
+#   profiles/submit-1990-05-17-20260101T120000.prof         pstats file (python -m pstats, snakeviz, ...)
+#   profiles/submit-1990-05-17-20260101T120000.tracemalloc  tracemalloc.Snapshot.load()
+#   profiles/submit-1990-05-17-20260101T120000.txt          top functions and allocation sites
+#
+# A capture is requested with AGE_INSIGHTS_PROFILE=1 (the next result page of the process, once) or with
+# ?profile=<secret> in the URL when AGE_INSIGHTS_PROFILE_SECRET=<secret> is set (that page).
+# tracemalloc traces the whole process, so allocations of other sessions running at the same time show up too.
+import cProfile
+import datetime
+import hmac
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+PROFILE_DIR = os.environ.get('AGE_INSIGHTS_PROFILE_DIR', 'profiles')
+# frames kept per allocation traceback
+TRACEMALLOC_FRAMES = 10
+# lines of each table in the text summary
+SUMMARY_LINES = 30
+# seconds after which a capture that was never stopped (its page failed) is dropped
+STALE_AFTER = 120
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# AGE_INSIGHTS_PROFILE=1 asks for one capture per process
+_env_pending = os.environ.get('AGE_INSIGHTS_PROFILE', '') == '1'
+_active = None
+
+
+# Define a function to tell whether the current page should be profiled (and use up the env request)
+def requested(query_params=None):
+    global _env_pending
+    secret = os.environ.get('AGE_INSIGHTS_PROFILE_SECRET')
+    if secret and query_params:
+        given = query_params.get('profile', [''])[0]
+        if hmac.compare_digest(given.encode(), secret.encode()):
+            return True
+    with _lock:
+        if _env_pending:
+            _env_pending = False
+            return True
+    return False
+
+
+class Capture:
+    def __init__(self, birthdate):
+        self.birthdate = birthdate
+        self.started = datetime.datetime.now()
+        self.profiler = cProfile.Profile()
+        # tracemalloc may already be on (python -X tracemalloc); leave it on then
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.started_at = time.perf_counter()
+        self.profiler.enable()
+
+    # Define a function to stop the capture and write its files; returns the path of the summary
+    def stop(self):
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.started_at
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.join(PROFILE_DIR, f"submit-{self.birthdate.isoformat()}-{self.started:%Y%m%dT%H%M%S}")
+        self.profiler.dump_stats(stem + '.prof')
+        snapshot.dump(stem + '.tracemalloc')
+
+        functions = io.StringIO()
+        pstats.Stats(self.profiler, stream=functions).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        allocations = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics('lineno')
+        with open(stem + '.txt', 'w') as f:
+            f.write(f"birthdate: {self.birthdate.isoformat()}\n")
+            f.write(f"started: {self.started.isoformat(timespec='seconds')}\n")
+            f.write(f"wall time: {elapsed * 1000:.1f} ms\n")
+            f.write(f"traced memory peak: {peak / 1024:.1f} KiB\n\n")
+            f.write("top allocation sites\n")
+            for statistic in allocations[:SUMMARY_LINES]:
+                f.write(f"  {statistic}\n")
+            f.write("\n" + functions.getvalue())
+        logger.info("profile of the %s page written to %s.*", self.birthdate.isoformat(), stem)
+        return stem + '.txt'
+
+
+# Define a function to start a capture of the current page (None while another one is running)
+def start(birthdate):
+    global _active
+    with _lock:
+        if _active is not None:
+            if time.perf_counter() - _active.started_at < STALE_AFTER:
+                logger.warning("a profile is already being captured, not profiling the %s page", birthdate.isoformat())
+                return None
+            # the page that started it failed before stopping it; its data is incomplete
+            _active.profiler.disable()
+            if _active.owns_tracemalloc:
+                tracemalloc.stop()
+            logger.warning("dropped the unfinished profile of the %s page", _active.birthdate.isoformat())
+        _active = Capture(birthdate)
+        return _active
+
+
+# Define a function to stop a capture and write its files; returns the path of the summary
+def stop(capture):
+    global _active
+    with _lock:
+        if _active is not capture:
+            return None
+        _active = None
+    return capture.stop()
@@ -0,0 +1,248 @@
+# Background refresh of the CSVs in Data/ from their upstream sources
+# A daemon thread fetches every configured source once per interval with a conditional request (ETag and
+# Last-Modified from the previous answer), so an unchanged source costs one 304. A new body is converted to the
+# CSV format of Data/, written next to the current file and checked (the columns the app reads with values of
+# their kind, no big loss of rows, and the app's year table builds from it) before it is swapped in with an atomic
+# rename. The next run of any session sees a new data version (see bundle.py and registry.py); the refresher
+# builds that version itself right after the swap, so sessions do not pay for it. Whatever fails (network, HTTP
+# error, a body that does not parse or check) leaves the last good file in place and is tried again at the next
+# interval.
+#
+#   AGE_INSIGHTS_REFRESH=1                        refresh in the background of the app (or api_server.py)
+#   AGE_INSIGHTS_REFRESH_INTERVAL=86400           seconds between two rounds
+#   AGE_INSIGHTS_REFRESH_SOURCES=sources.json     sources to use instead of SOURCES, same shape
+#
+#   python refresher.py [--sources sources.json]  run one round now and print what changed
+#
+# Of the sources credited on the page only NASA publishes a machine-readable file; the others are web pages.
+# A dataset without a machine-readable source can still be refreshed from a CSV export or mirror in the format
+# of its file in Data/ ('format': 'csv'). Run the refresher in one process per data folder.
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import insights
+import metrics
+import registry
+from bundle import check_columns
+from csv_reader import read_csv
+
+# dataset -> where to fetch it and how to read the body
+SOURCES = {
+    'temperature': {
+        'url': 'https://data.giss.nasa.gov/gistemp/graphs/graph_data/'
+               'Global_Mean_Estimates_based_on_Land_and_Ocean_Data/graph.txt',
+        'format': 'gistemp',
+    },
+}
+DEFAULT_INTERVAL = 24 * 60 * 60
+# seconds before a request is given up
+TIMEOUT = 30
+# largest body accepted (bytes)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# a new file must keep at least this share of the current file's rows
+MIN_ROW_RATIO = 0.9
+# validators of the last answer of every source, kept next to the CSVs
+STATE_FILE = 'refresh_state.json'
+USER_AGENT = 'Your_Age_Insights data refresher'
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshError(Exception):
+    pass
+
+
+########################################
+# Convert a body to the CSV format of Data/
+# Define a function to convert NASA's GISTEMP graph.txt (a text table after a few title lines) to world_temp.csv
+def _gistemp(body):
+    rows = re.findall(r'^\s*(\d{4})\s+(-?\d+\.\d+)\s+(-?\d+\.\d+)\s*$', body.decode('utf-8'), re.MULTILINE)
+    if not rows:
+        raise RefreshError("no 'year no_smoothing lowess' rows in the body")
+    return 'temp_year,no_smoothing,lowess\n' + ''.join(f'{year},{value},{lowess}\n' for year, value, lowess in rows)
+
+
+# Define a function to take a CSV body as it is
+def _csv(body):
+    return body.decode('utf-8-sig')
+
+
+PARSERS = {'gistemp': _gistemp, 'csv': _csv}
+
+
+# Define a function to check a new version of a dataset against the current one before it replaces it
+def _check(name, path, current_path):
+    new, current = read_csv(path), read_csv(current_path)
+    try:
+        check_columns(new, insights.DATASET_COLUMNS[name], os.path.basename(current_path))
+    except ValueError as error:
+        raise RefreshError(str(error)) from None
+    rows, current_rows = len(next(iter(new.values()))), len(next(iter(current.values())))
+    if rows < current_rows * MIN_ROW_RATIO:
+        raise RefreshError(f"{rows} rows, the current file has {current_rows}")
+    # build what every session builds from the data (the year table, the quiz timelines, the inflation engine)
+    # with the new version in place of the current one
+    sources = insights.load_sources(os.path.dirname(current_path))
+    sources[name] = new
+    try:
+        registry.DatasetRegistry(sources, None, datetime.date.today().year)
+    except Exception as error:
+        raise RefreshError(f"the app cannot use it: {error!r}") from None
+
+
+class Refresher:
+    def __init__(self, sources=None, data_dir=insights.DATA_DIR, interval=DEFAULT_INTERVAL, timeout=TIMEOUT):
+        self.sources = SOURCES if sources is None else sources
+        self.data_dir = data_dir
+        self.interval = interval
+        self.timeout = timeout
+        self.state_path = os.path.join(data_dir, STATE_FILE)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        self.updates = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Define a function to fetch one source and swap in its new version; returns 'updated', 'unchanged' or 'failed'
+    def refresh_source(self, name, source):
+        state = self.state.setdefault(name, {})
+        state['checked_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        headers = {'User-Agent': USER_AGENT}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+        current_path = os.path.join(self.data_dir, insights.DATASET_FILES[name])
+        temporary = os.path.join(self.data_dir, f'.{insights.DATASET_FILES[name]}.{os.getpid()}.tmp')
+        try:
+            try:
+                with urllib.request.urlopen(urllib.request.Request(source['url'], headers=headers),
+                                            timeout=self.timeout) as response:
+                    body = response.read(MAX_BODY_SIZE + 1)
+                    declared = response.headers.get('Content-Length', '')
+                    validators = {'etag': response.headers.get('ETag'),
+                                  'last_modified': response.headers.get('Last-Modified')}
+            except urllib.error.HTTPError as error:
+                if error.code == 304:
+                    state.pop('error', None)
+                    return 'unchanged'
+                raise RefreshError(f"HTTP {error.code}") from None
+            if len(body) > MAX_BODY_SIZE:
+                raise RefreshError(f"body larger than {MAX_BODY_SIZE} bytes")
+            # a connection closed early does not raise here, the body is only shorter than announced
+            if declared.isdigit() and len(body) < int(declared):
+                raise RefreshError(f"body cut short: {len(body)} of {declared} bytes")
+            text = PARSERS[source.get('format', 'csv')](body)
+            with open(current_path, encoding='utf-8') as f:
+                unchanged = f.read() == text
+            if not unchanged:
+                with open(temporary, 'w', encoding='utf-8', newline='') as f:
+                    f.write(text)
+                _check(name, temporary, current_path)
+                os.replace(temporary, current_path)
+            # the validators are only kept once the body was taken, so a failed body is fetched again next time
+            state.update(validators)
+            state.pop('error', None)
+            if unchanged:
+                return 'unchanged'
+            state['updated_at'] = state['checked_at']
+            self.updates += 1
+            logger.info("refreshed %s from %s", name, source['url'])
+            return 'updated'
+        except Exception as error:
+            # anything (a timeout, a connection cut mid-body, a body that does not parse) fails this source only
+            self.failures += 1
+            state['error'] = str(error)
+            logger.warning("could not refresh %s from %s, keeping the current data: %s", name, source['url'], error)
+            return 'failed'
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    # Define a function to refresh every source once; returns the outcome per dataset
+    def refresh(self):
+        outcomes = {}
+        for name, source in self.sources.items():
+            with metrics.span(f'refresh:{name}'):
+                outcomes[name] = self.refresh_source(name, source)
+        if 'updated' in outcomes.values():
+            # build the new data version here rather than in the next session's run
+            registry.current()
+        temporary = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(temporary, self.state_path)
+        return outcomes
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                # the thread must outlive any surprise; the data in place stays in use
+                logger.exception("data refresh round failed")
+            if self._stop.wait(self.interval):
+                return
+
+    # Define a function to refresh in a daemon thread: a round now, then one per interval
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='data-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {'sources': len(self.sources), 'updates': self.updates, 'failures': self.failures}
+
+
+# Define a function to read the sources from a JSON file of the same shape as SOURCES
+def load_sources(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+########################################
+# The refresher of this process, configured from the environment
+_refresher = None
+_lock = threading.Lock()
+
+
+# Define a function to start the background refresher once per process when AGE_INSIGHTS_REFRESH=1
+def start():
+    global _refresher
+    if os.environ.get('AGE_INSIGHTS_REFRESH', '') != '1':
+        return None
+    with _lock:
+        if _refresher is None:
+            path = os.environ.get('AGE_INSIGHTS_REFRESH_SOURCES')
+            _refresher = Refresher(load_sources(path) if path else None,
+                                   interval=float(os.environ.get('AGE_INSIGHTS_REFRESH_INTERVAL', DEFAULT_INTERVAL)))
+            metrics.register('refresher', _refresher.stats)
+            _refresher.start()
+        return _refresher
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh the CSVs in Data/ from their sources, once')
+    parser.add_argument('--sources', help='JSON file of sources to use instead of the built-in ones')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started_at = time.perf_counter()
+    outcomes = Refresher(load_sources(args.sources) if args.sources else None).refresh()
+    for name, outcome in outcomes.items():
+        print(f"{name:12s} {outcome}")
+    print(f"done in {time.perf_counter() - started_at:.1f}s")
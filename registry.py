@@ -0,0 +1,131 @@
+# Process-wide registry of the datasets, shared read-only by every session
+# The datasets are read from the data bundle once per data version and every session gets the same objects:
+# nothing is copied per call or per rerun, and every array is write-protected so a session cannot change
+# what the others see. Columns derived from the data (chart labels, the year table) are computed here once.
+import datetime
+import logging
+import mmap
+import sys
+import threading
+import types
+
+import numpy as np
+
+import insights
+from year_table import build_year_table
+
+logger = logging.getLogger(__name__)
+
+
+# Define a function to write-protect an array in place and return it
+def _freeze(values):
+    values.setflags(write=False)
+    return values
+
+
+# Define a function to get the bytes an array holds, and whether they live in the mapped bundle
+def _array_bytes(values):
+    base = values
+    while isinstance(base, np.ndarray) and base.base is not None:
+        base = base.base
+    if isinstance(base, memoryview):
+        base = base.obj
+    size = values.nbytes
+    if values.dtype == object:
+        size += sum(sys.getsizeof(value) for value in values)
+    return size, isinstance(base, mmap.mmap)
+
+
+# Define a function to get the resident memory of the process in bytes (None where /proc is not available)
+def process_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+########################################
+# Columns derived from the datasets
+def _derive(datasets):
+    # average age chart: only the countries with the minimum and the maximum average age get a label
+    ages = datasets['ages']
+    labels = np.full(len(ages['country']), None, dtype=object)
+    extremes = [ages['avg_age'].argmin(), ages['avg_age'].argmax()]
+    labels[extremes] = ages['country'][extremes]
+    ages['label'] = labels
+
+
+class DatasetRegistry:
+    def __init__(self, sources, version, last_year):
+        self.version = version
+        self.last_year = last_year
+        _derive(sources)
+        # read-only mappings of read-only arrays
+        self.datasets = {name: types.MappingProxyType({column: _freeze(values) for column, values in columns.items()})
+                         for name, columns in sources.items()}
+        self.year_table = build_year_table(self.datasets, last_year)
+        for values in self.year_table.columns.values():
+            _freeze(values)
+        for timeline in self.year_table.timelines.values():
+            _freeze(timeline.starts)
+            _freeze(timeline.codes)
+        _freeze(self.year_table.inflation.cumulative)
+
+    def __getitem__(self, name):
+        return self.datasets[name]
+
+    # Define a function to report the memory held by the registry: private bytes per dataset, bytes read
+    # straight from the mapped bundle (shared with every other process) and the resident size of the process
+    def memory(self):
+        report = {'datasets': {}, 'mapped_bytes': 0}
+        for name, columns in self.datasets.items():
+            private = 0
+            for values in columns.values():
+                size, mapped = _array_bytes(values)
+                if mapped:
+                    report['mapped_bytes'] += size
+                else:
+                    private += size
+            report['datasets'][name] = private
+        report['year_table'] = sum(_array_bytes(values)[0] for values in self.year_table.columns.values()) + \
+            self.year_table.inflation.cumulative.nbytes
+        report['private_bytes'] = sum(report['datasets'].values()) + report['year_table']
+        report['process_rss'] = process_rss()
+        return report
+
+
+########################################
+# The registry of the current data version
+_current = None
+# the (data version, last year) that last failed to build, so it is not tried again on every call
+_failed = None
+_lock = threading.Lock()
+
+
+# Define a function to get the registry, rebuilt when a CSV changes or the year rolls over
+# (data that cannot be built is logged and the last good registry stays in use until a new version builds)
+def current(last_year=None):
+    global _current, _failed
+    last_year = last_year or datetime.date.today().year
+    try:
+        version = insights.data_version()
+    except Exception:
+        if _current is None:
+            raise
+        logger.exception("could not read the data version, keeping %s", _current.version[:12])
+        return _current
+    with _lock:
+        key = (version, last_year)
+        if _current is None or ((_current.version, _current.last_year) != key and key != _failed):
+            try:
+                _current = DatasetRegistry(insights.load_sources(), version, last_year)
+            except Exception:
+                if _current is None:
+                    raise
+                _failed = key
+                logger.exception("could not build the dataset registry %s, keeping %s", version[:12],
+                                 _current.version[:12])
+            else:
+                logger.info("dataset registry %s: %s", version[:12], _current.memory())
+        return _current
@@ -0,0 +1,71 @@
+# Precomputed facts for every birthdate the form accepts
+# Every fact is a function of (birthdate, today) and the form only takes dates from 1900-01-01 to today, so all
+# of them are computed at once into one column per fact; a submit is then a single row lookup.
+# When the day rolls over only the columns that depend on today's date are recomputed and the new date is
+# appended; a new data version or a new year (which moves every "since your birth" fact) rebuilds the store.
+import datetime
+import logging
+import threading
+
+import numpy as np
+
+import insights
+from inflation import DEFAULT_CURRENCY
+
+FIRST_BIRTHDATE = np.datetime64('1900-01-01', 'D')
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+    def __init__(self, table, today, currency=DEFAULT_CURRENCY):
+        self.table = table
+        self.currency = currency
+        self.today = np.datetime64(today, 'D')
+        started_at = datetime.datetime.now()
+        self.columns = insights.compute_insights(np.arange(FIRST_BIRTHDATE, self.today + 1), self.today, table,
+                                                 currency)
+        logger.info("result store: %d birthdates, %.1f MB, built in %.0f ms", len(self), self.nbytes / 1e6,
+                    (datetime.datetime.now() - started_at).total_seconds() * 1000)
+
+    def __len__(self):
+        return len(self.columns['birthdate'])
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+    # Define a function to move the store to a later day: recompute the date-dependent columns, append the new dates
+    def advance(self, today):
+        today = np.datetime64(today, 'D')
+        if today <= self.today:
+            return
+        appended = insights.compute_insights(np.arange(self.today + 1, today + 1), today, self.table, self.currency)
+        refreshed = insights.date_dependent_facts(self.columns['birthdate'], today)
+        self.columns = {name: np.concatenate([refreshed.get(name, values), appended[name]])
+                        for name, values in self.columns.items()}
+        self.today = today
+
+    # Define a function to get the facts of one birthdate as plain Python values (None outside the store)
+    def row(self, birthdate):
+        position = int((np.datetime64(birthdate, 'D') - FIRST_BIRTHDATE).astype(np.int64))
+        if not 0 <= position < len(self):
+            return None
+        return insights.result_row(self.columns, position)
+
+
+########################################
+# The store of the current data and day
+_current = None
+_lock = threading.Lock()
+
+
+# Define a function to get a store for the given year table and day, advancing or rebuilding it as needed
+def current(table, today):
+    global _current
+    with _lock:
+        if _current is None or _current.table is not table or np.datetime64(today, 'D') < _current.today:
+            _current = ResultStore(table, today)
+        else:
+            _current.advance(today)
+        return _current
@@ -0,0 +1,52 @@
+# Cold start timing: how long the app took to import its modules and to render its first page
+# Streamlit re-runs main.py on every interaction but keeps this module imported, so each point is only
+# recorded the first time the process reaches it. The first page usually comes from a later run than the
+# imports (the one where the form is submitted), so points are measured from the start of their own run.
+import os
+import time
+
+# time.perf_counter() at the start of the current run of the script
+_run_started = None
+# name -> seconds from the start of its run to the first time the point was reached
+_marks = {}
+
+
+# Define a function to note the start of a run of the script
+def begin_run():
+    global _run_started
+    _run_started = time.perf_counter()
+
+
+# Define a function to record a point the first time it is reached; True when it was new
+def mark(name):
+    if name in _marks or _run_started is None:
+        return False
+    _marks[name] = time.perf_counter() - _run_started
+    return True
+
+
+# Define a function to get the seconds since the process started (None where /proc is not available)
+def process_age():
+    try:
+        with open('/proc/self/stat') as f:
+            # the command name may contain spaces, the fields after it do not
+            started_ticks = int(f.read().rpartition(')')[2].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - started_ticks / os.sysconf('SC_CLK_TCK')
+
+
+# Define a function to report in milliseconds: imports, first chart on the page, first full page
+def report():
+    def ms(name):
+        return round(_marks[name] * 1000, 1) if name in _marks else None
+
+    age = process_age()
+    return {
+        'imports_ms': ms('imports_done'),
+        'first_render_ms': ms('first_render'),
+        'first_run_ms': ms('run_done'),
+        'process_age_s': None if age is None else round(age, 1),
+    }
@@ -0,0 +1,327 @@
+# Static export: one standalone HTML page per birth year, for a static file server or a CDN
+# Most of the result page depends only on the birth year. Every page embeds its charts as Plotly JSON; a small
+# script fills in the parts that depend on the exact date (the age breakdown, the average age and planet
+# charts, the quiz answers), read from the address: site/1990.html#05-17. site/index.html holds the form.
+#
+#   python static_export.py --output site [--workers 4] [--force]
+#
+# Pages are built in parallel, one worker process per core. Each page has a fingerprint of everything it
+# shows (its year's facts, the timeline entries of that year, the shared datasets and the code that renders
+# it) kept in site/manifest.json, so after a data change only the pages whose fingerprint moved are rebuilt.
+import argparse
+import datetime
+import hashlib
+import html
+import json
+import logging
+import math
+import os
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import charts
+import figure_pool
+import insights
+import registry
+from live_age import AGE_FUNCTIONS
+from payload import compact_payload
+from year_table import FIRST_YEAR
+
+MANIFEST_FILE = 'manifest.json'
+PLOTLY_FILE = 'plotly.min.js'
+# the code a page is rendered by: a change to any of these files rebuilds every page
+SOURCE_FILES = ('static_export.py', 'charts.py', 'figure_pool.py', 'payload.py', 'live_age.py')
+
+logger = logging.getLogger(__name__)
+
+PAGE_TEMPLATE = string.Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Through the Time Lens: born in $year</title>
+<style>
+body { background-color: #0E1117; color: #FFFFFF; font-family: 'Source Sans Pro', sans-serif; max-width: 730px; margin: 0 auto; padding: 1em; }
+.source { text-align: center; font-size: 9px; color: #808080; }
+.source a, .author a { color: #808080; }
+.author { text-align: right; font-size: 14px; color: #808080; margin-top: 4em; }
+.quiz { text-align: left; font-size: 22px; font-weight: bold; }
+</style>
+<script src="$plotly"></script>
+</head>
+<body>
+<h1>Through the Time Lens: Your Age Revisited</h1>
+<p><a href="index.html" style="color: #808080;">Enter another birthdate</a></p>
+<div id="invalid" hidden></div>
+<div id="page">
+<p id="breakdown"></p>
+<p id="totals"></p>
+<p id="live"></p>
+<div id="average_age"></div>
+<p class="source">Data Source: <a href="https://www.worlddata.info/average-age.php" target="_blank">WorldData.info</a></p>
+<div id="planets"></div>
+<p class="source">Data Source: <a href="https://spaceplace.nasa.gov/years-on-other-planets/en/" target="_blank">NASA</a></p>
+$population
+<p class="source">Data Source: <a href="https://www.worldometers.info/world-population/" target="_blank">Worldometers</a></p>
+$temperature
+<div id="temperature"></div>
+<p class="source">Data Source: <a href="https://data.giss.nasa.gov/gistemp/graphs/graph_data/Global_Mean_Estimates_based_on_Land_and_Ocean_Data/graph.txt" target="_blank">NASA Global Climate Change</a></p>
+<div id="dollar"></div>
+<p class="source">Data Source: <a href="https://www.macrotrends.net/countries/USA/united-states/inflation-rate-cpi" target="_blank">Macrotrends</a></p>
+<p class="quiz">It's Quiz time!</p>
+$quiz
+</div>
+<p class="author">Author: <a href="https://www.linkedin.com/in/zakaria-chbani-475134167/" target="_blank">Zakaria Chbani</a></p>
+<script>
+const PAGE = $page;
+const FIGURES = $figures;
+$functions
+// the rest of the birthdate comes from the address (1990.html#05-17), January 1st without it
+const parts = (location.hash.slice(1) || '01-01').split('-').map(Number);
+const month = parts[0], day = parts[1];
+const birth = new Date(PAGE.year, month - 1, day);
+const now = new Date();
+window.addEventListener('hashchange', function () { location.reload(); });
+
+function draw(id, spec) {
+    spec.layout.font = Object.assign({color: '#FAFAFA'}, spec.layout.font);
+    Plotly.newPlot(id, spec.data, spec.layout, {displayModeBar: false, responsive: true});
+}
+
+if (birth.getMonth() !== month - 1 || birth.getDate() !== day || birth > now) {
+    document.getElementById('page').hidden = true;
+    document.getElementById('invalid').hidden = false;
+    document.getElementById('invalid').textContent = birth > now ?
+        'Please enter a date that is not in the future.' : 'Please enter a valid date.';
+} else {
+    const age = calendarAge(PAGE.year, month, day, now);
+    const userAge = age.years + age.months / 12;
+    document.getElementById('breakdown').innerHTML = 'You are <b>' + age.years + ' years</b>, <b>' + age.months +
+        ' months</b>, and <b>' + age.days + ' days</b> old.';
+    document.getElementById('totals').innerHTML = 'In total, you are <b>' + age.totalMonths + ' months</b> old, or <b>' +
+        age.totalDays + ' days</b> old, or <b>' + age.totalDays * 24 + ' hours</b> old.';
+    const tick = function () { document.getElementById('live').innerHTML = liveAge(PAGE.year, month, day, new Date()); };
+    tick();
+    setInterval(tick, 1000);
+
+    // the charts that depend on the exact age or date get it before they are drawn
+    FIGURES.average_age.data[1].x = [userAge];
+    const planets = FIGURES.planets.data[0];
+    planets.x = planets.y.map(function (planet) { return Math.round(userAge / PAGE.planets[planet] * 100) / 100; });
+    planets.text = planets.x.map(String);
+    const date = birth.getFullYear() + '-' + String(month).padStart(2, '0') + '-' + String(day).padStart(2, '0');
+    for (const name in PAGE.timelines) {
+        // a timeline without a quiz question has no chart to fill
+        if (!(name in FIGURES)) {
+            continue;
+        }
+        // the last entry that started on or before the birthdate
+        let answer = null;
+        for (const entry of PAGE.timelines[name]) {
+            if (entry[0] <= date) {
+                answer = entry[1];
+            }
+        }
+        FIGURES[name].data[0].hovertext = '<b>' + (answer || 'No data for your birth date') + '</b>';
+    }
+    for (const name in FIGURES) {
+        draw(name, FIGURES[name]);
+    }
+}
+</script>
+</body>
+</html>
+''')
+
+INDEX_TEMPLATE = string.Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Through the Time Lens: Your Age Revisited</title>
+<style>
+body { background-color: #0E1117; color: #FFFFFF; font-family: 'Source Sans Pro', sans-serif; max-width: 730px; margin: 0 auto; padding: 1em; }
+label { display: block; margin: 0.5em 0; }
+</style>
+</head>
+<body>
+<h1>Through the Time Lens: Your Age Revisited</h1>
+<form id="form">
+<label>Enter your birth year <input id="year" type="number" min="$first" max="$last" value="2000" required></label>
+<label>Enter your birth month <input id="month" type="number" min="1" max="12" value="1" required></label>
+<label>Enter your birth day <input id="day" type="number" min="1" max="31" value="1" required></label>
+<button type="submit">Submit</button>
+</form>
+<script>
+document.getElementById('form').addEventListener('submit', function (event) {
+    event.preventDefault();
+    const value = function (id) { return String(document.getElementById(id).value).padStart(2, '0'); };
+    location.href = Number(value('year')) + '.html#' + value('month') + '-' + value('day');
+});
+</script>
+</body>
+</html>
+''')
+
+
+# Define a function to turn a number into a JSON value (None for NaN)
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+# Define a function to embed a value as JSON in a script element
+def _script_json(value):
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+########################################
+# What a page shows
+# Define a function to gather everything the page of a birth year shows (the charts are built from it)
+def page_data(year, datasets):
+    years = np.array([year])
+    table = datasets.year_table
+    population = insights.population_increase(years, table)
+    first, last = np.datetime64(f'{year}-01-01', 'D'), np.datetime64(f'{year}-12-31', 'D')
+    timelines = {}
+    for name, timeline in table.timelines.items():
+        # the entry in effect on January 1st (the year table's column), then every entry that starts later in the year
+        later = (timeline.starts > first) & (timeline.starts <= last)
+        timelines[name] = [[str(first), table.decode(name, table.column(name, years))[0]]] + \
+            [[str(start), label] for start, label in zip(timeline.starts[later], timeline.decode(timeline.codes[later]))]
+    return {
+        'year': year,
+        'birth_year_population': _number(population['birth_year_population'][0]),
+        'population_increase': _number(population['population_increase'][0]),
+        'population_increase_percentage': _number(population['population_increase_percentage'][0]),
+        'density_increase': _number(population['density_increase'][0]),
+        'density_increase_percentage': _number(population['density_increase_percentage'][0]),
+        'temp_change': _number(insights.temperature_change(years, table)['temp_change'][0]),
+        'dollar_value': _number(insights.dollar_value(years, table)['dollar_value'][0]),
+        'planets': dict(insights.planet_orbital_periods),
+        'timelines': timelines,
+    }
+
+
+# Define a function to fingerprint what every page shares: the datasets drawn in full and the rendering code
+def shared_fingerprint(datasets):
+    digest = hashlib.sha256()
+    for name in ('ages', 'temperature'):
+        for column, values in sorted(datasets[name].items()):
+            digest.update(column.encode())
+            digest.update(_script_json(np.asarray(values).tolist()).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for source in SOURCE_FILES:
+        with open(os.path.join(directory, source), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Define a function to fingerprint one page
+def page_fingerprint(data, shared):
+    return hashlib.sha256((shared + _script_json(data)).encode()).hexdigest()
+
+
+########################################
+# Render the pages
+# Define a function to render the page of a birth year (runs in a worker process)
+def render_page(year, version):
+    datasets = registry.current()
+    if datasets.version != version:
+        raise figure_pool.StaleDataError(f"worker data {datasets.version[:12]} != export data {version[:12]}")
+    data = page_data(year, datasets)
+    # the age and the quiz answers are placeholders, set by the page's script before drawing
+    keys = {'average_age': ('average_age', 0.0), 'planets': ('planets', 100.0)}
+    if data['population_increase'] is not None:
+        keys['population'] = ('population', year)
+    keys.update({'temperature': ('temperature', year), 'dollar': ('dollar', year)})
+    keys.update({name: (name, '') for name in charts.QUIZ_QUESTIONS})
+    figures = {name: json.loads(compact_payload(figure_pool.build_figure(key, datasets))) for name, key in keys.items()}
+
+    if data['population_increase'] is not None:
+        population = (
+            f"<p>Since you were born, the world's population has increased by approximately "
+            f"<b>{data['population_increase'] / 1000000.0:.2f} million</b> people "
+            f"({data['population_increase_percentage']:.2f}%).</p>\n"
+            f"<p>The world's population density has increased by approximately <b>{int(data['density_increase'])} "
+            f"people/sq. km</b> ({data['density_increase_percentage']:.2f}%).</p>\n<div id=\"population\"></div>")
+    else:
+        population = "<p>Data for the entered birth year is not available.</p>"
+    if data['temp_change'] is not None:
+        temperature = f"<p>The global surface temperature has changed by {data['temp_change']:.2f}°C since your birth year.</p>"
+    else:
+        temperature = "<p>Temperature data for the entered birth year is not available.</p>"
+    return PAGE_TEMPLATE.substitute(
+        year=year,
+        plotly=PLOTLY_FILE,
+        population=population,
+        temperature=temperature,
+        quiz='\n'.join(f'<div id="{html.escape(name)}"></div>' for name in charts.QUIZ_QUESTIONS),
+        page=_script_json(data),
+        figures=_script_json(figures),
+        functions=AGE_FUNCTIONS,
+    )
+
+
+# Define a function to write a file atomically, so a server never sends half a page
+def _write(path, text):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+# Define a function to load the datasets in a worker before its first page
+def _warm_up():
+    registry.current()
+
+
+# Define a function to export the pages of every birth year whose fingerprint changed; returns the years built
+def export(output, workers=None, force=False, today=None):
+    today = today or datetime.date.today()
+    datasets = registry.current(today.year)
+    os.makedirs(output, exist_ok=True)
+    manifest_path = os.path.join(output, MANIFEST_FILE)
+    manifest = {'pages': {}, 'plotly': None}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    shared = shared_fingerprint(datasets)
+    years = range(FIRST_YEAR, today.year + 1)
+    fingerprints = {str(year): page_fingerprint(page_data(year, datasets), shared) for year in years}
+    stale = [year for year in years if manifest['pages'].get(str(year)) != fingerprints[str(year)]
+             or not os.path.exists(os.path.join(output, f'{year}.html'))]
+    logger.info("%d of %d pages to build", len(stale), len(fingerprints))
+
+    try:
+        if stale:
+            with ProcessPoolExecutor(workers or figure_pool.worker_count(), initializer=_warm_up) as pool:
+                pages = pool.map(render_page, stale, [datasets.version] * len(stale))
+                for year, page in zip(stale, pages):
+                    _write(os.path.join(output, f'{year}.html'), page)
+                    manifest['pages'][str(year)] = fingerprints[str(year)]
+        # the pages load Plotly from the same folder; it is only written again for another Plotly version
+        import plotly
+        if manifest['plotly'] != plotly.__version__ or not os.path.exists(os.path.join(output, PLOTLY_FILE)):
+            from plotly.offline import get_plotlyjs
+            _write(os.path.join(output, PLOTLY_FILE), get_plotlyjs())
+            manifest['plotly'] = plotly.__version__
+        _write(os.path.join(output, 'index.html'), INDEX_TEMPLATE.substitute(first=FIRST_YEAR, last=today.year))
+    finally:
+        _write(manifest_path, json.dumps(manifest, indent=1, sort_keys=True))
+    return stale
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a static page for every birth year')
+    parser.add_argument('--output', default='site', help='folder to write the pages to')
+    parser.add_argument('--workers', type=int, help='worker processes (default: the cores this process may use)')
+    parser.add_argument('--force', action='store_true', help='rebuild every page, whatever the manifest says')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    built = export(args.output, args.workers, args.force)
+    print(f"{len(built)} pages built in {args.output}/")
@@ -0,0 +1,66 @@
+# Every chart of the app stays within its budget in charts.CHART_BUDGETS, for birth years across the whole range
+#
+#   python -m pytest tests
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import charts  # noqa: E402
+import cohort  # noqa: E402
+import figure_pool  # noqa: E402
+import insights  # noqa: E402
+import registry  # noqa: E402
+from figure_cache import figure_payload  # noqa: E402
+from payload import compact_payload  # noqa: E402
+
+TODAY = datetime.date.today()
+# every birth year the app accepts
+BIRTH_YEARS = range(cohort.FIRST_BIRTHDATE.astype(object).year, TODAY.year + 1)
+
+
+@pytest.fixture(scope='module')
+def datasets():
+    return registry.current(TODAY.year)
+
+
+# Define a function to list the cache keys of every chart shown for a birth year (see figure_pool.build_figure)
+def _chart_keys(year, datasets):
+    age = float(TODAY.year - year)
+    keys = [('average_age', age), ('planets', age), ('temperature', year), ('dollar', year)]
+    # like main.py, the population chart is only shown for years with population data
+    if not np.isnan(insights.population_increase(np.array([year]), datasets.year_table)['population_increase'][0]):
+        keys.append(('population', year))
+    new_years_day = np.array([f'{year}-01-01'], dtype='datetime64[D]')
+    for name in charts.QUIZ_QUESTIONS:
+        answer = datasets.year_table.timelines[name].at(new_years_day)[0]
+        keys.append((name, answer or 'No data for your birth date'))
+    return keys
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['full', 'compact'])
+def test_charts_within_budget(datasets, compact):
+    serialize = compact_payload if compact else figure_payload
+    violations = []
+    for year in BIRTH_YEARS:
+        for key in _chart_keys(year, datasets):
+            fig = figure_pool.build_figure(key, datasets)
+            name = 'quiz' if key[0] in charts.QUIZ_QUESTIONS else key[0]
+            violations.extend(f"{year}: {violation}" for violation in charts.budget_violations(name, fig, serialize(fig)))
+    assert violations == []
+
+
+@pytest.mark.parametrize('compact', [False, True], ids=['full', 'compact'])
+def test_cohort_chart_within_budget(datasets, compact):
+    # one birthdate a week from the first accepted one to today: a bar for every age the app can show
+    today = np.datetime64(TODAY, 'D')
+    dates = np.arange(cohort.FIRST_BIRTHDATE, today + 1, 7)
+    summary = cohort.CohortSummary(TODAY, datasets.year_table)
+    summary.update(dates, np.ones(len(dates), dtype=bool), insights.compute_insights(dates, today, datasets.year_table))
+    fig = charts.cohort_age_figure(summary.age_years())
+    assert charts.budget_violations('cohort_ages', fig, (compact_payload if compact else figure_payload)(fig)) == []
@@ -0,0 +1,143 @@
+# The refresher against a local stand-in for the upstream servers (http.server on localhost)
+# Every failure must leave the last good file in the data folder, byte for byte.
+#
+#   python -m pytest tests
+import http.server
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import insights  # noqa: E402
+import refresher  # noqa: E402
+from csv_reader import read_csv  # noqa: E402
+
+TEMPERATURE_FILE = insights.DATASET_FILES['temperature']
+PRESIDENTS_FILE = insights.DATASET_FILES['presidents']
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    # what the next requests get: status, body, headers and the Content-Length announced (None: the body's length)
+    reply = (200, b'', {}, None)
+    requests = []
+
+    def do_GET(self):
+        status, body, headers, length = self.reply
+        StandIn.requests.append(dict(self.headers))
+        # a conditional request for the current version gets a 304, like a real server
+        if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            status, body = 304, b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    StandIn.requests = []
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # a copy of Data/ without the bundle, so the real folder is never touched
+    shutil.copytree(os.path.join(REPO_DIR, 'Data'), tmp_path / 'Data',
+                    ignore=shutil.ignore_patterns('datasets.bundle', '*.tmp', 'refresh_state.json'))
+    return str(tmp_path / 'Data')
+
+
+# Define a function to write the temperature data as NASA's graph.txt does (a few title lines, then the table)
+def graph_txt(rows):
+    lines = ['Land-Ocean Temperature Index (C)', '--------------------------------', '',
+             'Year No_Smoothing  Lowess(5)', '----------------------------']
+    lines += [f'{year}     {value:.2f}     {lowess:.2f}' for year, value, lowess in rows]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+# Define a function to get the rows of the current temperature file
+def temperature_rows(data_dir):
+    columns = read_csv(os.path.join(data_dir, TEMPERATURE_FILE))
+    return list(zip(columns['temp_year'].tolist(), columns['no_smoothing'].tolist(), columns['lowess'].tolist()))
+
+
+# Define a function to read a file of the data folder as bytes
+def contents(data_dir, file_name):
+    with open(os.path.join(data_dir, file_name), 'rb') as f:
+        return f.read()
+
+
+def test_update_then_not_modified_then_update(server, data_dir):
+    rows = temperature_rows(data_dir) + [(2023, 1.17, 1.01)]
+    StandIn.reply = (200, graph_txt(rows), {'ETag': '"v1"'}, None)
+    source = {'url': server + '/graph.txt', 'format': 'gistemp'}
+    fetcher = refresher.Refresher({'temperature': source}, data_dir=data_dir)
+
+    assert fetcher.refresh_source('temperature', source) == 'updated'
+    assert read_csv(os.path.join(data_dir, TEMPERATURE_FILE))['temp_year'][-1] == 2023
+    # the same version again: the server answers 304 to the conditional request and nothing is written
+    before = contents(data_dir, TEMPERATURE_FILE)
+    assert fetcher.refresh_source('temperature', source) == 'unchanged'
+    assert StandIn.requests[-1].get('If-None-Match') == '"v1"'
+    assert contents(data_dir, TEMPERATURE_FILE) == before
+    # a new version
+    StandIn.reply = (200, graph_txt(rows + [(2024, 1.29, 1.05)]), {'ETag': '"v2"'}, None)
+    assert fetcher.refresh_source('temperature', source) == 'updated'
+    assert read_csv(os.path.join(data_dir, TEMPERATURE_FILE))['temp_year'][-1] == 2024
+    assert fetcher.stats() == {'sources': 1, 'updates': 2, 'failures': 0}
+    assert not [name for name in os.listdir(data_dir) if name.endswith('.tmp')]
+
+
+@pytest.mark.parametrize('reply', [
+    # a body without the table
+    (200, b'<html>Service moved</html>', {}, None),
+    # the connection closes before the announced length
+    'truncated',
+    # a file cut after a few rows
+    'few_rows',
+    (503, b'unavailable', {}, None),
+], ids=['malformed', 'truncated', 'few_rows', '503'])
+def test_failures_keep_the_last_good_file(server, data_dir, reply):
+    rows = temperature_rows(data_dir) + [(2023, 1.17, 1.01), (2024, 1.29, 1.05)]
+    if reply == 'truncated':
+        # cut inside the last row: what arrived still parses, minus that row
+        body = graph_txt(rows)
+        reply = (200, body[:-8], {}, len(body))
+    elif reply == 'few_rows':
+        reply = (200, graph_txt(rows[:10]), {}, None)
+    StandIn.reply = reply
+    source = {'url': server + '/graph.txt', 'format': 'gistemp'}
+    fetcher = refresher.Refresher({'temperature': source}, data_dir=data_dir)
+    before = contents(data_dir, TEMPERATURE_FILE)
+
+    assert fetcher.refresh_source('temperature', source) == 'failed'
+    assert contents(data_dir, TEMPERATURE_FILE) == before
+    assert fetcher.state['temperature']['error']
+    assert not [name for name in os.listdir(data_dir) if name.endswith('.tmp')]
+
+
+def test_a_file_the_app_cannot_read_is_refused(server, data_dir):
+    # the columns are all there, but the dates are not in the format the presidents timeline reads
+    StandIn.reply = (200, contents(data_dir, PRESIDENTS_FILE).replace(b'/', b'-'), {}, None)
+    source = {'url': server + '/presidents.csv', 'format': 'csv'}
+    fetcher = refresher.Refresher({'presidents': source}, data_dir=data_dir)
+    before = contents(data_dir, PRESIDENTS_FILE)
+
+    assert fetcher.refresh_source('presidents', source) == 'failed'
+    assert contents(data_dir, PRESIDENTS_FILE) == before
+    assert 'appointment_date' in fetcher.state['presidents']['error']
@@ -0,0 +1,54 @@
+# The chart message built from a cached payload (figure_cache.show_payload) against Streamlit's own
+# Both tests fail when a Streamlit upgrade changes what st.plotly_chart sends or the private API used to send it.
+#
+#   python -m pytest tests
+import datetime
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+import harness  # noqa: E402
+import charts  # noqa: E402
+import figure_pool  # noqa: E402
+import insights  # noqa: E402
+import registry  # noqa: E402
+from figure_cache import CHART_CONFIG, figure_payload, plotly_chart_proto  # noqa: E402
+from streamlit.elements.plotly_chart import marshall  # noqa: E402
+from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto  # noqa: E402
+
+BIRTHDATE = datetime.date(1990, 5, 17)
+
+
+# Define a function to list the chart keys main.py shows for a birthdate, in page order
+def _page_keys(birthdate):
+    result = insights.insights_for(birthdate)
+    keys = [('average_age', result['user_age']), ('planets', result['user_age']), ('population', birthdate.year),
+            ('temperature', birthdate.year), ('dollar', birthdate.year)]
+    return keys + [(name, result[name] or 'No data for your birth date') for name in charts.QUIZ_QUESTIONS]
+
+
+@pytest.mark.parametrize('chart', ['average_age', 'planets', 'population', 'temperature', 'dollar', 'president'])
+def test_message_matches_st_plotly_chart(chart):
+    datasets = registry.current()
+    key = next(key for key in _page_keys(BIRTHDATE) if key[0] == chart)
+    fig = figure_pool.build_figure(key, datasets)
+    expected = PlotlyChartProto()
+    marshall(expected, fig, use_container_width=False, sharing='streamlit', theme='streamlit', config=CHART_CONFIG)
+    assert plotly_chart_proto(figure_payload(fig)) == expected
+
+
+def test_cached_charts_render_through_the_app():
+    datasets = registry.current()
+    expected = [figure_payload(figure_pool.build_figure(key, datasets)) for key in _page_keys(BIRTHDATE)]
+    session = harness.Session()
+    # the second submit of the same birthdate is served from the figure cache
+    for _ in range(2):
+        messages = session.submit(BIRTHDATE).messages
+        elements = [message.delta.new_element for message in messages if message.HasField('delta')]
+        specs = [element.plotly_chart.figure.spec for element in elements if element.WhichOneof('type') == 'plotly_chart']
+        assert specs == expected
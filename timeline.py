@@ -0,0 +1,60 @@
+# Sorted interval index for "what was current at your birth" lookups
+# Each dataset lists the date an entry took effect; the entry stays current until the next one starts
+import datetime
+
+import numpy as np
+
+# sentinel code for dates before the first entry
+MISSING = -1
+
+# timeline datasets: result name -> (source name, date column, date format, label column, quiz question)
+# a new quiz dataset (Popes, UK PMs, Olympics hosts, ...) only needs its CSV in Data/, an entry in
+# insights.DATASET_FILES and DATASET_COLUMNS (the label column; the date column is added from here) and a line
+# here: the quiz in main.py, the API, the cohort mode and the static pages all follow this registry
+TIMELINES = {
+    'president': ('presidents', 'appointment_date', '%m/%d/%Y', 'president',
+                  'Guess who was the US president at your birth?'),
+    # a bare year means the entry counts from January 1st of that year
+    'world_cup_winner': ('world_cup', 'year', '%Y', 'winner',
+                         'Guess who was the last FIFA World Cup winner at your birth?'),
+    'second_largest_economy': ('economies', 'year', '%Y', '2nd',
+                               'Guess the second largest economy by average GDP at your birth?'),
+}
+
+
+class TimelineIndex:
+    def __init__(self, starts, labels):
+        # starts are sorted datetime64[D] boundaries, labels the entry that begins at each of them
+        order = np.argsort(starts, kind='stable')
+        self.starts = np.asarray(starts, dtype='datetime64[D]')[order]
+        self.labels, codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+        self.labels = list(self.labels)
+        self.codes = codes.astype(np.int16)[order]
+
+    @classmethod
+    def from_columns(cls, columns, date_column, date_format, label_column):
+        # columns is a dict of arrays (csv_reader) or a DataFrame
+        starts = np.array([datetime.datetime.strptime(str(value), date_format).date()
+                           for value in columns[date_column]], dtype='datetime64[D]')
+        return cls(starts, np.asarray(columns[label_column]))
+
+    # Define a function to get the code of the entry in effect at each date (MISSING before the first one)
+    def codes_at(self, dates):
+        positions = np.searchsorted(self.starts, np.asarray(dates, dtype='datetime64[D]'), side='right') - 1
+        return np.where(positions >= 0, self.codes[np.maximum(positions, 0)], MISSING).astype(np.int16)
+
+    # Define a function to turn codes back into labels (None for the sentinel)
+    def decode(self, codes):
+        labels = np.append(np.asarray(self.labels, dtype=object), None)
+        return labels[np.where(codes == MISSING, len(labels) - 1, codes)]
+
+    # Define a function to get the label of the entry in effect at each date
+    def at(self, dates):
+        return self.decode(self.codes_at(dates))
+
+
+########################################
+# Parse every registered timeline once
+def build_timelines(sources, timelines=None):
+    return {name: TimelineIndex.from_columns(sources[source], date_column, date_format, label_column)
+            for name, (source, date_column, date_format, label_column, _) in (timelines or TIMELINES).items()}
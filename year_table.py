@@ -0,0 +1,80 @@
+# Dense per-birth-year lookup table compiled once from the CSVs in Data/
+# Row i holds every year-keyed fact for the year FIRST_YEAR + i, so a lookup is a plain array index
+import datetime
+
+import numpy as np
+
+from inflation import DEFAULT_CURRENCY, build_inflation_engine
+from timeline import build_timelines
+
+FIRST_YEAR = 1900
+# sentinel for integer columns and category codes of years without data (float columns use NaN)
+MISSING = -1
+
+
+class YearTable:
+    def __init__(self, columns, last_year, timelines, inflation):
+        self.columns = columns
+        self.last_year = last_year
+        # the timelines are kept for the quizzes that change within a year (a president takes office on any day)
+        self.timelines = timelines
+        # the inflation engine answers the dollar fact for the other currencies
+        self.inflation = inflation
+        # the latest row with data plays the role of the current year for the "since your birth" facts
+        self.latest_population = columns['population'][columns['population'] != MISSING][-1]
+        self.latest_density = columns['density'][columns['density'] != MISSING][-1]
+        self.latest_temp_anomaly = columns['temp_anomaly'][~np.isnan(columns['temp_anomaly'])][-1]
+
+    def __len__(self):
+        return self.last_year - FIRST_YEAR + 1
+
+    # Define a function to map years to row positions; out-of-range years point at the trailing sentinel row
+    def positions(self, years):
+        positions = np.asarray(years, dtype=np.int64) - FIRST_YEAR
+        positions[(positions < 0) | (positions >= len(self))] = len(self)
+        return positions
+
+    def column(self, name, years):
+        return self.columns[name][self.positions(years)]
+
+    # Define a function to turn category codes back into labels (None for the sentinel)
+    def decode(self, name, codes):
+        return self.timelines[name].decode(codes)
+
+
+########################################
+# Compile the datasets into the dense table
+def build_year_table(sources, last_year=None):
+    last_year = last_year or datetime.date.today().year
+    years = np.arange(FIRST_YEAR, last_year + 1)
+    # one extra trailing row holds the sentinels for years outside the table
+    size = len(years) + 1
+    columns = {'year': np.append(years, MISSING)}
+
+    def place(data_years, values, missing, dtype):
+        out = np.full(size, missing, dtype=dtype)
+        data_years = np.asarray(data_years, dtype=np.int64)
+        inside = (data_years >= FIRST_YEAR) & (data_years <= last_year)
+        out[data_years[inside] - FIRST_YEAR] = np.asarray(values)[inside]
+        return out
+
+    # population and density
+    pop = sources['population']
+    columns['population'] = place(pop['year'], pop['population'], MISSING, np.int64)
+    columns['density'] = place(pop['year'], pop['density'], MISSING, np.int32)
+    # temperature anomaly
+    temp_df = sources['temperature']
+    columns['temp_anomaly'] = place(temp_df['temp_year'], temp_df['no_smoothing'], np.nan, np.float64)
+
+    # cumulative inflation factor: the value at the end of last_year of $1 from the start of each year
+    inflation = build_inflation_engine(sources['inflation'])
+    columns['inflation_factor'] = np.append(inflation.value(DEFAULT_CURRENCY, years, last_year), np.nan)
+
+    # category columns (president, World Cup winner, second-largest economy, ...): the timeline entry
+    # in effect on January 1st of each year, stored as int16 codes into the timeline labels
+    timelines = build_timelines(sources)
+    new_years_days = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    for name, timeline in timelines.items():
+        columns[name] = np.append(timeline.codes_at(new_years_days), MISSING).astype(np.int16)
+
+    return YearTable(columns, last_year, timelines, inflation)